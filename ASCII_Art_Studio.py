@@ -2,10 +2,199 @@
 @author Henry Svedberg
 '''
 
-from PIL import Image, ImageEnhance
-import numpy as np
+import importlib
 import os
-import json
+import struct
+import sys
+import fnmatch
+import time
+import threading
+import weakref
+
+
+class _LazyModule:
+    '''The class _LazyModule stands in for a module that is only imported the
+    first time one of its attributes is used. This keeps the startup of the
+    program fast, since Pillow and numpy take much longer to import than the
+    rest of the program and are not needed for things like printing the 
+    help. importlib.import_module is used for the actual import since it is
+    safe to call from several threads at once.'''
+    
+    def __init__(self, name):
+        self._name = name
+        
+    def __getattr__(self, attribute):
+        value = getattr(importlib.import_module(self._name), attribute)
+        setattr(self, attribute, value) #so the next lookup is a normal one
+        return value
+
+
+# the heavy modules are only loaded when they are first used
+np = _LazyModule("numpy")
+Image = _LazyModule("PIL.Image")
+ImageEnhance = _LazyModule("PIL.ImageEnhance")
+ImageDraw = _LazyModule("PIL.ImageDraw")
+ImageFont = _LazyModule("PIL.ImageFont")
+json = _LazyModule("json")
+hashlib = _LazyModule("hashlib")
+
+
+class MappedImage:
+    '''The class MappedImage is a small stand in for a grayscale Pillow image
+    whose pixels are memory mapped from a binary PGM/PNM, .npy or headerless
+    raw file instead of being decoded into memory. It only implements the 
+    parts of the Image interface that ASCII_art uses (size, resize and 
+    conversion to an array) so that the rest of the pipeline does not need 
+    to know where the pixels come from.
+    
+    Resizing picks the nearest pixel for each new pixel, so making a small
+    preview of a huge frame only reads the pages that contain the sampled 
+    pixels. Other methods that need every pixel, such as enhancing the 
+    image, first have to convert it into a real Pillow image with to_image.
+    '''
+    
+    mode = "L"
+    
+    def __init__(self, pixels, max_value=255):
+        '''instanciating object from a 2d array of grey values or a 3d array
+        of rgb values, where max_value is the value that represents white'''
+        
+        self._pixels = pixels
+        self._max_value = max_value
+        self.height, self.width = pixels.shape[:2]
+        
+    @property
+    def size(self):
+        return (self.width, self.height)
+    
+    @classmethod
+    def open(cls, image_path, raw_size=None, raw_dtype="uint8"):
+        '''Method to memory map the file in image_path. raw_size is the 
+        (width, height) of a headerless raw file and must be given for those.
+        Returns None if the file is a format that can't be mapped (such as
+        ascii PGM files) so that it can be decoded by Pillow instead. 
+        
+        Only integer pixels can be mapped, where the largest value of the 
+        type is white. Float pixels have no such range (they can be 0-1 or
+        0-255) and finding it would mean reading the whole file, so they 
+        raise a ValueError.'''
+        
+        extension = os.path.splitext(image_path)[1].lower()
+        if raw_size:
+            width, height = raw_size
+            dtype = np.dtype(raw_dtype)
+            cls._check_integer(image_path, dtype)
+            pixels = np.memmap(image_path, dtype=dtype, mode="r",
+                               shape=(height, width))
+            return cls(pixels, np.iinfo(dtype).max)
+        elif extension == ".npy":
+            pixels = np.load(image_path, mmap_mode="r")
+            if pixels.ndim not in (2, 3):
+                raise ValueError(f"{image_path} does not contain a 2d image")
+            cls._check_integer(image_path, pixels.dtype)
+            return cls(pixels, np.iinfo(pixels.dtype).max)
+        elif extension in (".pgm", ".pnm", ".ppm"):
+            return cls._open_pnm(image_path)
+        elif extension == ".raw":
+            raise ValueError(f"The size of the raw file {image_path} must be"
+                             " given as raw_size")
+        return None
+    
+    @staticmethod
+    def _check_integer(image_path, dtype):
+        '''Method to raise a ValueError if the pixels of image_path are not 
+        integers, see open'''
+        if dtype.kind not in "ui":
+            raise ValueError(f"The pixels of {image_path} are {dtype}, but "
+                             "only integer pixels are supported. Scale them "
+                             "to 0-255 and save them as uint8 first")
+    
+    @classmethod
+    def _open_pnm(cls, image_path):
+        '''Method to read the header of a binary PGM (P5) or PPM (P6) file and
+        map the pixels that follow it.'''
+        
+        with open(image_path, "rb") as file:
+            header = file.read(1024)
+        
+        # header is: magic, width, height, maxval separated by whitespace,
+        # where a # starts a comment that runs to the end of the line
+        fields = []
+        position = 0
+        while len(fields) < 4 and position < len(header):
+            char = header[position:position + 1]
+            if char == b"#":
+                position = header.find(b"\n", position)
+                if position == -1:
+                    break
+            elif char.isspace():
+                position += 1
+            else:
+                start = position
+                while position < len(header) and not (
+                        header[position:position + 1].isspace() or 
+                        header[position:position + 1] == b"#"):
+                    position += 1
+                fields.append(header[start:position])
+        
+        if len(fields) < 4 or fields[0] not in (b"P5", b"P6"):
+            return None
+        width, height, max_value = (int(field) for field in fields[1:])
+        dtype = np.uint8 if max_value < 256 else np.dtype(">u2")
+        shape = (height, width) if fields[0] == b"P5" else (height, width, 3)
+        # exactly one whitespace character separates the header and pixels
+        pixels = np.memmap(image_path, dtype=dtype, mode="r", 
+                           offset=position + 1, shape=shape)
+        return cls(pixels, max_value)
+    
+    def _to_gray(self, pixels):
+        '''Method to convert a block of mapped pixels into 8 bit grey values
+        with the same weights for rgb as Pillow uses in convert("L")'''
+        
+        pixels = np.asarray(pixels)
+        if pixels.ndim == 3:
+            pixels = pixels[..., :3] @ np.array([0.299, 0.587, 0.114])
+        if pixels.dtype == np.uint8 and self._max_value == 255:
+            return pixels
+        scaled = pixels * (255 / self._max_value)
+        return np.clip(np.rint(scaled), 0, 255).astype(np.uint8)
+    
+    def __array__(self, dtype=None, copy=None):
+        pixels = self._to_gray(self._pixels)
+        return pixels if dtype is None else pixels.astype(dtype)
+    
+    def resize(self, size, resample=None):
+        '''Method to resize by sampling the nearest pixel. Returns a Pillow
+        image with only the sampled pixels.'''
+        
+        width, height = size
+        rows = ((np.arange(height) + 0.5) * self.height / height).astype(np.intp)
+        cols = ((np.arange(width) + 0.5) * self.width / width).astype(np.intp)
+        sampled = self._pixels[np.ix_(rows, cols)]
+        return Image.fromarray(self._to_gray(sampled))
+    
+    def to_image(self):
+        '''Method to read all pixels into a grayscale Pillow image'''
+        return Image.fromarray(np.asarray(self))
+    
+    def crop(self, box):
+        '''Method to get the region box (left, top, right, bottom) as a new 
+        MappedImage. Nothing is read since the memory map is only sliced'''
+        left, top, right, bottom = box
+        return MappedImage(self._pixels[top:bottom, left:right], 
+                           self._max_value)
+
+
+class _ResizedImage:
+    '''A resized image in the store of ASCII_art (see ASCII_art._shared) 
+    together with the variance that was computed with it. ASCII_art objects
+    keep a reference to it so that it stays in the store while it is used'''
+    
+    __slots__ = ("image", "cell_variance", "__weakref__")
+    
+    def __init__(self, image, cell_variance=None):
+        self.image = image
+        self.cell_variance = cell_variance
 
 
 class ASCII_art:
@@ -23,33 +212,360 @@ class ASCII_art:
     console or to a new file.
     '''
     
-    def _load_image(self, image_path):
+    def _load_image(self, image_path, raw_size=None, raw_dtype="uint8", 
+                    box=None, min_size=None):
         '''Method to load an image from a file on the computer and convert it 
-      into grayscale'''
+      into grayscale. Binary PGM/PNM, .npy and raw files (raw_size must then
+      be given as (width, height)) are memory mapped as a MappedImage instead
+      of being decoded, so only the pixels that are used are read. If box is
+      given, only that region (left, top, right, bottom) is loaded, see 
+      _decode_region.'''
   
+        mapped = MappedImage.open(image_path, raw_size, raw_dtype)
+        if mapped is not None:
+            return mapped if box is None else mapped.crop(box)
+        if box is not None:
+            try:
+                with Image.open(image_path) as img:
+                    return self._decode_region(img, box, min_size).convert("L")
+            except OSError:
+                pass #Pillow's decoders raise OSError if the region can't be 
+                     #decoded on its own, so the whole image is decoded and 
+                     #cropped below
         with Image.open(image_path) as img:
             img.load()
+            if box is not None:
+                return img.convert(mode="L").crop(box)
             return img.convert(mode="L")
+        
+    @staticmethod
+    def _decode_region(img, box, min_size=None):
+        '''Method to decode only the region box of an opened image, as far 
+        as the format allows it:
+        
+        - JPEG images are decoded at a smaller scale (with draft) when the 
+          region would still have at least min_size (width, height) pixels,
+          which is much faster for large images.
+        - Images stored in several tiles or strips (such as tiled TIFF) only
+          decode the tiles that overlap the region.
+        - Uncompressed images stored in one piece only read the rows of the 
+          region.
+        
+        Anything else is decoded whole and then cropped. This includes all 
+        compressed TIFFs (LZW, deflate or JPEG, which covers most real 
+        tiled TIFFs), since Pillow decodes those with libtiff as one single
+        tile, so only uncompressed tiled or strip TIFFs are limited to the 
+        region. Pillow has no way to decode a part of an image, so the tiles
+        (changed with _replace_tile) and the size of img are set directly.'''
+        
+        left, top, right, bottom = box
+        if not (0 <= left < right <= img.size[0] and 
+                0 <= top < bottom <= img.size[1]):
+            raise ValueError(f"The region {box} is not inside the image")
+        if img.format == "JPEG" and min_size:
+            factor = min((right - left) / min_size[0], 
+                         (bottom - top) / min_size[1])
+            if factor >= 2:
+                full_width, full_height = img.size
+                img.draft("L", (int(full_width / factor), 
+                                int(full_height / factor)))
+                scale_x = img.size[0] / full_width
+                scale_y = img.size[1] / full_height
+                left, right = int(left * scale_x), max(int(left * scale_x) + 1, 
+                                                       int(right * scale_x))
+                top, bottom = int(top * scale_y), max(int(top * scale_y) + 1, 
+                                                      int(bottom * scale_y))
+        
+        elif len(img.tile) > 1:
+            tiles = [tile for tile in img.tile if tile[1][0] < right and 
+                     tile[1][2] > left and tile[1][1] < bottom and 
+                     tile[1][3] > top]
+            origin_x = min(tile[1][0] for tile in tiles)
+            origin_y = min(tile[1][1] for tile in tiles)
+            img.tile = [ASCII_art._replace_tile(tile, (
+                tile[1][0] - origin_x, tile[1][1] - origin_y,
+                tile[1][2] - origin_x, tile[1][3] - origin_y)) 
+                for tile in tiles]
+            img._size = (max(tile[1][2] for tile in img.tile),
+                         max(tile[1][3] for tile in img.tile))
+            left, right = left - origin_x, right - origin_x
+            top, bottom = top - origin_y, bottom - origin_y
+            
+        elif len(img.tile) == 1 and img.tile[0][0] == "raw" and \
+            img.mode == "L" and tuple(img.tile[0][3])[:3] in [
+                ("L", 0, 1), ("L", img.size[0], 1)]:
+            #one top-down strip with one byte per pixel: skip to the rows
+            tile = img.tile[0]
+            img.tile = [ASCII_art._replace_tile(
+                tile, (0, 0, img.size[0], bottom - top), 
+                tile[2] + top * img.size[0])]
+            img._size = (img.size[0], bottom - top)
+            top, bottom = 0, bottom - top
+            
+        return img.crop((left, top, right, bottom))
 
                                                   
-    def __init__(self, image_path):
+    @staticmethod
+    def _replace_tile(tile, extents, offset=None):
+        '''Method to get a copy of a Pillow tile (codec, extents, offset, 
+        args) with new extents and offset. Newer versions of Pillow use 
+        named tuples for the tiles, which have to stay named tuples'''
+        if offset is None:
+            offset = tile[2]
+        if hasattr(tile, "_replace"):
+            return tile._replace(extents=extents, offset=offset)
+        return (tile[0], extents, offset) + tuple(tile[3:])
+                                                  
+    def __init__(self, image_path, raw_size=None, raw_dtype="uint8"):
         '''instanciating object from image with attributes corresponding to the
-        image properties as well as a gray scale attribute'''
+        image properties as well as a gray scale attribute. raw_size and 
+        raw_dtype are only used for headerless raw files. Only the header of
+        the image is read here, the pixels are decoded when they are first
+        needed (see _image)'''
         
-        self._image = self._load_image(image_path)
+        self._image_path = image_path
+        self._crop = None
+        self._mode = "ascii"
+        self._dither = False
+        self._raw_size = tuple(raw_size) if raw_size else None
+        self._raw_dtype = raw_dtype
         self._file_name = os.path.basename(image_path)
-        self._height = self._image.height
-        self._width = self._image.width
+        self._content_digest = None #see _digest
+        self._resized_from = None
+        self._current_image = None
+        self._spill_file = None
+        self._histogram_cache = None #see _histogram
+        self._source = ("decoded", self._raw_size, raw_dtype, None, None)
+        self._edited_from = None #see _edit
+        self._edits = []
+        mapped = MappedImage.open(image_path, raw_size, raw_dtype)
+        self._mapped = mapped is not None
+        if mapped is not None:
+            self._width, self._height = mapped.size
+        else:
+            with Image.open(image_path) as img:
+                self._width, self._height = img.size
         self._aspect_ratio = self._height / self._width
         self._contrast = 1
         self._brightness = 1
+        self._tone = "off"
+        self._gamma = 1
         self.gscale= "$@B%8&WM#*oahkbdpqwmZO0QLCJUYXzcvunxrjft/\|()1{}[]?-_+~<>i!lI;:,\"^`'. "
        
       # gray scale level values from: 
       # http://paulbourke.net/dataformats/asciiart/ 
       # 70 levels of gray 
     
-    def resize(self, new_height=None, new_width= None):
+    # decoded and resized images, shared between all ASCII_art objects with 
+    # the same file content and parameters, see _shared
+    _store = weakref.WeakValueDictionary()
+    _store_lock = threading.Lock()
+    
+    # the digest of each file, by (path, size, modification time) so a file
+    # is only hashed again if it has changed. Only the _digests_limit most 
+    # recently hashed files are kept
+    _digests = {}
+    _digests_limit = 1024
+    
+    @classmethod
+    def _file_digest(cls, image_path):
+        '''Method to get a hash of the bytes of a file (blake2b, which is 
+        fast and has no collisions in practice). Files with the same content
+        get the same digest, whatever their names are.'''
+        
+        stat = os.stat(image_path)
+        key = (os.path.abspath(image_path), stat.st_size, stat.st_mtime_ns)
+        with cls._store_lock:
+            digest = cls._digests.pop(key, None)
+        if digest is None:
+            content = hashlib.blake2b(digest_size=16)
+            with open(image_path, "rb") as file:
+                for chunk in iter(lambda: file.read(1 << 20), b""):
+                    content.update(chunk)
+            digest = content.hexdigest()
+        with cls._store_lock:
+            cls._digests[key] = digest #last in the dict is the newest
+            while len(cls._digests) > cls._digests_limit:
+                del cls._digests[next(iter(cls._digests))]
+        return digest
+    
+    @property
+    def _digest(self):
+        '''The key of the image file in the store (see _shared). For decoded
+        images it is the digest of the whole file (see _file_digest), which 
+        is only computed when it is first needed. Memory mapped images would 
+        have to be read completely to be hashed, although only the sampled 
+        pixels are used, so they are kept apart by their path, size and 
+        modification time instead (the raw size and type are in the rest of
+        the key).'''
+        if self._content_digest is None and self._mapped:
+            stat = os.stat(self._image_path)
+            self._content_digest = (f"{os.path.abspath(self._image_path)}"
+                                    f"|{stat.st_size}|{stat.st_mtime_ns}")
+        elif self._content_digest is None:
+            self._content_digest = self._file_digest(self._image_path)
+        return self._content_digest
+    
+    def _shared(self, key, make):
+        '''Method to get the image (or _ResizedImage) stored under key, or
+        make it with the function make and store it. The keys start with 
+        the digest of the file (see _digest), so every object with the same
+        content and parameters gets the same image, which is only decoded or
+        resized once (the digest is put in front of the key here). The store
+        only keeps weak references, so an image is dropped when no object 
+        uses it any more.'''
+        
+        key = (self._digest,) + key
+        with self._store_lock:
+            value = self._store.get(key)
+        if value is None:
+            value = make()
+            with self._store_lock:
+                value = self._store.setdefault(key, value)
+        return value
+    
+    @property
+    def _image(self):
+        '''The image that is rendered. While it is the unchanged decoded 
+        image, it is only decoded when it is first used, from the store if 
+        another object has already decoded the same content. That way no 
+        decoding is done at all if the resized image is already stored. A
+        resized image that was dropped (see release) is taken from the store
+        the same way.'''
+        
+        if self._current_image is None and self._spill_file:
+            pixels = np.load(self._spill_file)
+            os.remove(self._spill_file)
+            self._spill_file = None
+            self._current_image = Image.fromarray(pixels)
+        elif self._current_image is None and self._source is None:
+            self._replay() #only the edits were kept, see release
+        if self._current_image is None:
+            stored = self._stored(self._source)
+            if isinstance(stored, _ResizedImage):
+                self._resized_from = stored
+                self._cell_variance = stored.cell_variance
+                stored = stored.image
+            self._current_image = stored
+        return self._current_image
+    
+    def _stored(self, key):
+        '''Method to get the image in the store for a source key (see 
+        _shared). The key is the decoding parameters followed by the 
+        (sizes, resample, variance) of each resize, so a resized image that
+        is not stored any more is made again from its stored parent.'''
+        
+        if len(key) == 5:
+            *_, box, min_size = key
+            return self._shared(key, lambda: self._load_image(
+                self._image_path, self._raw_size, self._raw_dtype, box, 
+                min_size))
+        sizes, resample, variance = key[-1]
+        def resize_parent():
+            parent = self._stored(key[:-1])
+            if isinstance(parent, _ResizedImage):
+                parent = parent.image
+            return self._resized(parent, sizes, resample, variance)
+        return self._shared(key, resize_parent)
+    
+    @_image.setter
+    def _image(self, image):
+        self._current_image = image
+        self._histogram_cache = None
+        self._source = None #the image is no longer the one in the store
+        self._cell_variance = None #it was the variance of the old pixels
+    
+    def _edit(self, *edit):
+        '''Method to change the pixels with edit (see _apply_edit). The 
+        edits made since the image was last the one in the store are kept, 
+        together with the key of that image, so that release can drop the 
+        pixels and _replay can make exactly the same pixels again. Returns
+        what _apply_edit returns.'''
+        
+        image = self._image
+        if self._source is not None:
+            self._edited_from, self._edits = self._source, []
+        result = self._apply_edit(image, edit)
+        if isinstance(result, _ResizedImage):
+            self._image = result.image
+        else:
+            self._image = result
+        self._edits.append(edit)
+        return result
+    
+    def _apply_edit(self, image, edit):
+        '''Method to apply one edit to image and return the new image. 
+        edit is one of ("to_image",), ("resize", sizes, resample, variance),
+        for which a _ResizedImage is returned (see _resized), ("point", lut)
+        or ("enhance", attribute, factor).'''
+        
+        kind, *arguments = edit
+        if kind == "to_image":
+            return image.to_image()
+        elif kind == "resize":
+            return self._resized(image, *arguments)
+        elif kind == "point":
+            return image.point(*arguments)
+        attribute, factor = arguments
+        enhancers = {"brightness": ImageEnhance.Brightness, 
+                     "contrast": ImageEnhance.Contrast}
+        return enhancers[attribute](image).enhance(factor)
+    
+    def _replay(self):
+        '''Method to make the pixels of a released image again by applying 
+        its edits (see _edit) to the stored image they were made from'''
+        
+        image = self._stored(self._edited_from)
+        if isinstance(image, _ResizedImage):
+            image = image.image
+        cell_variance = None
+        for edit in self._edits:
+            result = self._apply_edit(image, edit)
+            if isinstance(result, _ResizedImage):
+                image, cell_variance = result.image, result.cell_variance
+            else:
+                image, cell_variance = result, None
+        self._current_image = image
+        self._cell_variance = cell_variance
+        
+    def _held_images(self):
+        '''Method to get the images and arrays the object keeps in memory. 
+        Memory mapped images are not included since their pages belong to
+        the file and can be dropped by the operating system at any time.'''
+        held = [self._current_image, getattr(self, "_cell_variance", None)]
+        if self._resized_from is not None:
+            held.append(self._resized_from.image)
+        return [item for item in held 
+                if item is not None and not isinstance(item, MappedImage)]
+    
+    @staticmethod
+    def _held_bytes(item):
+        '''Method to get the size in bytes of an image or array from 
+        _held_images'''
+        if hasattr(item, "nbytes"):
+            return item.nbytes
+        return item.width * item.height * len(item.getbands())
+        
+    def release(self, spill_folder=None):
+        '''Method to free the memory of the pixels until they are used 
+        again (see _image). A decoded or only resized image is simply taken
+        from the store again, or made again if no other object still uses 
+        it, so it stays shared. An image with changed pixels is saved as a 
+        .npy file in spill_folder, or if spill_folder is None only its 
+        edits are kept and they are applied again (see _replay), which 
+        gives the same pixels but takes longer.'''
+        
+        if self._current_image is not None and self._source is None and \
+            spill_folder is not None:
+            self._spill_file = os.path.join(spill_folder, f"{id(self)}.npy")
+            np.save(self._spill_file, np.asarray(self._current_image))
+        self._current_image = None
+        self._resized_from = None
+        self._cell_variance = None
+        self._histogram_cache = None
+    
+    def resize(self, new_height=None, new_width= None, resample="area",
+               variance=False):
         ''' Method to rezise an image with the arguments new_height and new_width.
         Both values can be set manually but its not the primary intent as it is 
         meant to handle user input specifying either width or height. 
@@ -59,9 +575,31 @@ class ASCII_art:
         letters are rougly twice as tall as they are wide. 
 
         If neither new height or new width are specified , then the default 
-        new width is 50 with the height calcualted accordingly. '''
+        new width is 50 with the height calcualted accordingly. If new_width
+        is "fit", the width is set to fit in the console window.
+        
+        When the image is made smaller in both directions, the default 
+        resample="area" sets each new pixel to the exact mean of the area of
+        the original image it covers (see _area_average, which is faster 
+        than Pillow's own filters, see bench_resize in benchmark.py). If 
+        variance is True, the variance of each area is computed as well, 
+        which takes about twice as long, and kept in the attribute 
+        _cell_variance until the pixels are changed. Any other value for 
+        resample is passed on as the filter to Pillow's resize, which is 
+        also used when enlarging. Memory mapped images are always 
+        sampled so that only the needed pixels are read. 
+        
+        new_width and new_height are always counted in letters. In the 
+        render modes with several pixels per letter (see set_mode), the 
+        image gets that many more pixels. 
+        
+        If the image is the decoded image or only resized, the resized image
+        is shared with every other object with the same content (see 
+        _shared).'''
         
 
+        if new_width == "fit":
+            new_width = self._terminal_width()
         if not new_height and not new_width:
             new_width = 50
             new_height = int(round((self._aspect_ratio * new_width / 2),0))
@@ -71,11 +609,221 @@ class ASCII_art:
             new_width = int(round((new_height / self._aspect_ratio * 2),0)) 
        
         
-        sizes = (new_width, new_height)
-        self._image = self._image.resize(sizes)
+        cell_width, cell_height = self.render_modes[self._mode]
+        sizes = (new_width * cell_width, new_height * cell_height)
+        if self._source is not None:
+            key = self._source + ((sizes, resample, variance),)
+            resized = self._stored(key)
+            self._current_image = resized.image #still the stored image
+            self._histogram_cache = None
+            self._source = key
+        else:
+            resized = self._edit("resize", sizes, resample, variance)
+        self._cell_variance = resized.cell_variance
+        self._resized_from = resized
         self._target_width = new_width
         self._target_height = new_height
         
+    def _resized(self, image, sizes, resample, variance=False):
+        '''Method to resize image to sizes (in pixels) as explained in 
+        resize. Returns a _ResizedImage with the image and, if variance is 
+        True, its variance.'''
+        
+        shrinking = sizes[0] <= image.width and sizes[1] <= image.height
+        if isinstance(image, MappedImage):
+            return _ResizedImage(image.resize(sizes))
+        elif resample == "area" and shrinking:
+            mean, cell_variance = self._area_average(np.asarray(image), *sizes,
+                                                     variance=variance)
+            return _ResizedImage(Image.fromarray(
+                np.clip(np.rint(mean), 0, 255).astype(np.uint8)), 
+                cell_variance)
+        elif resample == "area":
+            return _ResizedImage(image.resize(sizes))
+        return _ResizedImage(image.resize(sizes, resample))
+        
+    @staticmethod
+    def _block_sums(values, new_length):
+        '''Method to sum values (along the first axis) over new_length equally
+        large blocks whose boundaries don't have to be integers. 
+        
+        The whole rows of each block are added with one numpy sum (which is
+        much faster than cumsum or reduceat along the first axis, since it 
+        adds whole rows at a time) and the rows that are only partly inside
+        the block are added by how much of them is inside. Since the pixels 
+        are constant over their area, this is exact.'''
+        
+        length = values.shape[0]
+        if length % new_length == 0: #whole blocks, no partly covered rows
+            return values.reshape(new_length, length // new_length, 
+                                  *values.shape[1:]).sum(axis=1, 
+                                                         dtype=np.float64)
+        if values.dtype.kind in "ui" and values.dtype.itemsize <= 2:
+            dtype = np.uint32 if length * 2**16 < 2**32 else np.uint64
+        elif values.dtype.kind in "ui":
+            dtype = np.int64
+        else:
+            dtype = np.float64
+        
+        boundaries = np.linspace(0, length, new_length + 1)
+        whole = boundaries.astype(np.intp)
+        fraction = boundaries - whole #the part of the row at a boundary
+        sums = np.empty((new_length,) + values.shape[1:])
+        for block in range(new_length):
+            start, stop = whole[block], whole[block + 1]
+            sums[block] = values[start:stop].sum(axis=0, dtype=dtype)
+            if fraction[block]:
+                sums[block] -= fraction[block] * values[start]
+            if fraction[block + 1]:
+                sums[block] += fraction[block + 1] * values[stop]
+        return sums
+    
+    # number of columns squared at a time so that the squares of a large 
+    # image don't need much more memory than the image itself
+    _area_strip_width = 1024
+    
+    @classmethod
+    def _area_average(cls, pixels, new_width, new_height, variance=True):
+        '''Method to downsample a 2d array of pixels into new_height rows and
+        new_width columns of cells, where every cell gets the mean (and 
+        variance) of the pixels it covers, counting partly covered pixels by 
+        how much of them are inside the cell. The pixels are summed over the
+        rows of each cell first and then over the columns, so every pixel is
+        only read once. Returns the arrays (mean, variance), where the 
+        variance is float32 since it is kept with the image, or None if 
+        variance is False.'''
+        
+        height, width = pixels.shape
+        cell_area = (height / new_height) * (width / new_width)
+        row_sums = cls._block_sums(pixels, new_height)
+        mean = cls._block_sums(np.ascontiguousarray(row_sums.T), 
+                               new_width).T / cell_area
+        if not variance:
+            return mean, None
+        
+        row_squares = np.empty((new_height, width))
+        for start in range(0, width, cls._area_strip_width):
+            strip = pixels[:, start:start + cls._area_strip_width].astype(
+                np.uint32)
+            stop = start + strip.shape[1]
+            row_squares[:, start:stop] = cls._block_sums(strip * strip, 
+                                                         new_height)
+        squares = cls._block_sums(np.ascontiguousarray(row_squares.T), 
+                                  new_width).T / cell_area
+        return mean, np.maximum(squares - mean * mean, 0).astype(np.float32)
+        
+    def crop(self, x=None, y=None, width=None, height=None):
+        '''Method to only render the region of the original image that starts
+        at (x, y) and is width x height pixels. Without arguments the crop is 
+        removed. The image is decoded again from its file, but only the 
+        region (see _decode_region), and the target width, brightness and 
+        contrast are applied to it again. The target height follows the 
+        aspect ratio of the region.'''
+        
+        if x is None:
+            self._crop = None
+        else:
+            left, top = max(0, int(x)), max(0, int(y))
+            right = min(self._width, int(x) + int(width))
+            bottom = min(self._height, int(y) + int(height))
+            if right <= left or bottom <= top:
+                raise ValueError("The crop region is outside the image")
+            self._crop = (left, top, right, bottom)
+        
+        left, top, right, bottom = self._crop or (0, 0, self._width, 
+                                                  self._height)
+        self._aspect_ratio = (bottom - top) / (right - left)
+        if hasattr(self, "_target_width"):
+            self._target_height = max(1, int(round(
+                self._aspect_ratio * self._target_width / 2)))
+        self._rebuild()
+        
+    def zoom(self, factor, center_x=0.5, center_y=0.5):
+        '''Method to crop the image to a viewport that is factor times 
+        smaller than the whole image in both directions. The center of the
+        viewport is given as a fraction of the width and height of the image
+        (0.5, 0.5 is the middle) and is moved if the viewport would end up
+        outside the image. A factor of 1 shows the whole image.'''
+        
+        if factor < 1:
+            raise ValueError("The zoom factor must be at least 1")
+        if factor == 1:
+            self.crop()
+            return
+        width = max(1, int(round(self._width / factor)))
+        height = max(1, int(round(self._height / factor)))
+        x = min(max(0, int(round(center_x * self._width - width / 2))),
+                self._width - width)
+        y = min(max(0, int(round(center_y * self._height - height / 2))),
+                self._height - height)
+        self.crop(x, y, width, height)
+        
+    def _rebuild(self):
+        '''Method to decode the image from its file again and apply the crop,
+        target size, brightness and contrast that the object has'''
+        
+        width = getattr(self, "_target_width", None)
+        height = getattr(self, "_target_height", None)
+        cell_width, cell_height = self.render_modes[self._mode]
+        self._current_image = None #decoded again when used, see _image
+        self._histogram_cache = None
+        self._source = ("decoded", self._raw_size, 
+                        self._raw_dtype, self._crop, 
+                        (width * cell_width, height * cell_height) 
+                        if width and height and self._crop else None)
+        brightness, contrast = self._brightness, self._contrast
+        self._brightness = self._contrast = 1
+        self.apply_settings(width=width, height=height, brightness=brightness,
+                            contrast=contrast)
+        
+    def _enhance_lut(self, brightness_factor, contrast_factor):
+        '''Method to build a lookup table that gives the same result as 
+        enhancing the brightness and then the contrast with ImageEnhance. 
+        Both enhancers blend every pixel with another image, which for a 
+        grayscale image only depends on the grey value of the pixel, so they
+        can be applied to a gradient with all 256 grey values instead. The 
+        mean used by the contrast enhancer is computed from the histogram of 
+        the image after the brightness change.'''
+        
+        gradient = Image.frombytes("L", (256, 1), bytes(range(256)))
+        brightened = ImageEnhance.Brightness(gradient).enhance(
+            brightness_factor)
+        brightness_lut = np.asarray(brightened)[0]
+        
+        histogram = np.bincount(brightness_lut, weights=self._image.histogram(),
+                                minlength=256)
+        mean = int(np.dot(np.arange(256), histogram) / histogram.sum() + 0.5)
+        degenerate = Image.new("L", (256, 1), mean)
+        contrasted = Image.blend(degenerate, brightened, contrast_factor)
+        return np.asarray(contrasted)[0]
+    
+    def apply_settings(self, width=None, height=None, brightness=None, 
+                       contrast=None, tone=None, gamma=None):
+        '''Method to apply several changes to the image at once. The image is
+        resized if width or height is given (like the resize method) and the
+        new brightness and contrast (like image_enhance, in relation to the
+        original value of 1.0) are applied together with one lookup table, 
+        so the pixels are only gone through once for both. tone and gamma 
+        are only saved, see set_tone.'''
+        
+        if tone is not None or gamma is not None:
+            self.set_tone(tone, gamma)
+        if width or height:
+            self.resize(new_height=height, new_width=width)
+        if brightness in [None, self._brightness] and \
+            contrast in [None, self._contrast]:
+            return
+        if isinstance(self._image, MappedImage):
+            self._edit("to_image")
+        
+        brightness = self._brightness if brightness is None else brightness
+        contrast = self._contrast if contrast is None else contrast
+        lut = self._enhance_lut(brightness / self._brightness, 
+                                contrast / self._contrast)
+        self._edit("point", lut.tolist())
+        self._brightness = brightness
+        self._contrast = contrast
+        
     def image_enhance(self, attribute, parameter):
         '''
     Method to enhance the brightness or contrast of an image. Valid arguments
@@ -89,14 +837,15 @@ class ASCII_art:
     
     '''
         #using the methods for PIl image objects
+        if isinstance(self._image, MappedImage) and attribute in [
+                "brightness", "contrast"]:
+            self._edit("to_image")
         if attribute == "brightness":
-            enhancer = ImageEnhance.Brightness(self._image)
-            self._image = enhancer.enhance(parameter / self._brightness)
+            self._edit("enhance", attribute, parameter / self._brightness)
             #user input for the program is limited to prevent parameter = 0
             self._brightness = parameter
         elif attribute == "contrast":
-            enhancer = ImageEnhance.Contrast(self._image)
-            self._image = enhancer.enhance(parameter / self._contrast)
+            self._edit("enhance", attribute, parameter / self._contrast)
             self._contrast = parameter
         else:
             raise NameError("Invalid attribute name. Only 'brightness' and \
@@ -104,7 +853,7 @@ class ASCII_art:
     
 
 
-    #note: the following two methods are meant to be used on a np.array which
+    #note: the following methods are meant to be used on a np.array which
     # is defined in the render function further below. 
     
     def __normalize(self, x, min_support=0, max_support=None, 
@@ -127,45 +876,477 @@ class ASCII_art:
         
    
   
-    __vectorize_index = np.vectorize(lambda self, i: self.gscale[i])
-    #lambda function combined with np.vectorize that takes an np.array as 
-    #argument and returns the indexed the elements in gscale based on the value 
-   # of each element  in the array. For example, if the value  is 0, then it 
-   #returns gscale[0]
+    def _index_lut(self):
+        '''Method to build a lookup table with the gscale index for each of the
+        256 possible grey values. The table is built with the same normalize
+        method as before so that the rounding is exactly the same, but it only
+        has to be done once per render instead of once per pixel. The tone 
+        mapping (see set_tone) is folded into the same table.'''
+        
+        lut = np.rint(self.__normalize(np.arange(256))).astype(np.intp)
+        tone = self._tone_lut()
+        return lut if tone is None else lut[tone]
+    
+    # the automatic tone mappings, see set_tone
+    tone_modes = ["off", "levels", "equalize"]
+    
+    # the share of the darkest and of the lightest pixels that auto levels 
+    # lets become completely black or white, so a few outliers don't count
+    _levels_clip = 0.005
+    
+    def set_tone(self, tone=None, gamma=None):
+        '''Method to set how the grey values are mapped before rendering. 
+        "levels" stretches the grey values so that the darkest pixels become
+        black and the lightest white, "equalize" spreads them so that every 
+        letter is used about equally often, and "off" keeps them as they 
+        are. gamma is applied after that: above 1 makes the mid tones 
+        lighter and below 1 darker. Nothing is done to the pixels here, the 
+        mapping is made from the histogram of the image when it is 
+        rendered.'''
+        
+        if tone is not None:
+            if tone not in self.tone_modes:
+                raise NameError(f"Invalid tone '{tone}'. Valid tones are: "
+                                f"{', '.join(self.tone_modes)}")
+            self._tone = tone
+        if gamma is not None:
+            if gamma <= 0:
+                raise ValueError("gamma must be a positive number")
+            self._gamma = gamma
+            
+    def _histogram(self):
+        '''Method to get the 256 bin histogram of the image. It is computed 
+        with np.bincount and cached until the image is replaced (everything 
+        that replaces it clears the cache). Only the histogram is kept, so 
+        the cache doesn't keep an old image in memory.'''
+        
+        if self._histogram_cache is None:
+            self._histogram_cache = np.bincount(
+                np.asarray(self._image).ravel(), minlength=256)
+        return self._histogram_cache
+        
+    def _tone_lut(self):
+        '''Method to build the lookup table with the new grey value for each
+        of the 256 grey values, from the tone and gamma that are set. Returns 
+        None if neither is set, so that rendering is the same as before.'''
+        
+        if self._tone == "off" and self._gamma == 1:
+            return None
+        grey = np.arange(256, dtype=np.float64)
+        if self._tone != "off":
+            cumulative = np.cumsum(self._histogram())
+            total = cumulative[-1]
+        if self._tone == "levels":
+            low = np.searchsorted(cumulative, total * self._levels_clip, 
+                                  side="right")
+            high = np.searchsorted(cumulative, total * (1 - self._levels_clip))
+            if high > low:
+                grey = (grey - low) * 255 / (high - low)
+        elif self._tone == "equalize":
+            darkest = cumulative[np.flatnonzero(cumulative)[0]]
+            if total > darkest:
+                grey = (cumulative - darkest) * 255 / (total - darkest)
+        grey = np.clip(grey, 0, 255)
+        if self._gamma != 1:
+            grey = 255 * (grey / 255) ** (1 / self._gamma)
+        return np.rint(grey).astype(np.uint8)
+    
+    # the pixels (width, height) that make up one letter in each render mode
+    render_modes = {
+        "ascii": (1, 1),
+        "halfblock": (1, 2),
+        "braille": (2, 4),
+    }
     
+    # 4x4 ordered dither (Bayer) matrix, used as thresholds when dithering
+    _bayer = ((0, 8, 2, 10), (12, 4, 14, 6), (3, 11, 1, 9), (15, 7, 13, 5))
+    
+    # the bit of the letter index for each pixel of a cell (numbered row by 
+    # row). For braille these are the unicode dots 1, 4, 2, 5, 3, 6, 7, 8
+    _cell_bits = {
+        "halfblock": (1, 0),
+        "braille": (0, 3, 1, 4, 2, 5, 6, 7),
+    }
+    
+    def set_mode(self, mode, dither=None):
+        '''Method to change how the image is rendered. "ascii" uses one pixel 
+        per letter of gscale, "halfblock" two pixels on top of each other per
+        letter (using the half block characters) and "braille" 2x4 pixels per
+        letter (using the unicode braille dots). The two last ones only show 
+        if a pixel is dark or light, and with dither=True an ordered dither 
+        is used to show the grey values in between. Since the image then 
+        needs more pixels for the same target size, it is decoded again.'''
+        
+        if mode not in self.render_modes:
+            raise NameError(f"Invalid mode '{mode}'. Valid modes are: "
+                            f"{', '.join(self.render_modes)}")
+        changed = mode != self._mode
+        self._mode = mode
+        if dither is not None:
+            self._dither = dither
+        if changed and hasattr(self, "_target_width"):
+            self._rebuild()
+            
+    def _glyphs(self):
+        '''Method to get the letters for the current mode, in the order of 
+        the indexes that _tile_indexes gives'''
+        if self._mode == "halfblock":
+            return [" ", "\u2584", "\u2580", "\u2588"] #bottom, top, both
+        elif self._mode == "braille":
+            return [chr(0x2800 + bits) for bits in range(256)]
+        return self.gscale
+    
+    def _glyph_table(self, encoding="utf-8"):
+        '''Method to encode every letter of the current mode into bytes. The
+        table is returned as a 2d uint8 array with one row per letter (padded
+        with zeros to the longest letter), together with a mask of the same 
+        shape telling which bytes are used, so that whole rows of pixels can
+        be encoded with numpy indexing even if the letters have different 
+        lengths (like the space and the half blocks in utf-8).'''
+        
+        encoded = [letter.encode(encoding, errors="replace") 
+                   for letter in self._glyphs()]
+        lengths = np.array([len(letter) for letter in encoded], dtype=np.intp)
+        table = np.zeros((len(encoded), lengths.max()), dtype=np.uint8)
+        for index, letter in enumerate(encoded):
+            table[index, :len(letter)] = np.frombuffer(letter, dtype=np.uint8)
+        return table, np.arange(lengths.max()) < lengths[:, None]
+    
+    def _tile_indexes(self, tile, lut):
+        '''Method to get the index of the letter (see _glyphs) for every cell
+        in a tile of pixels. In ascii mode the index comes from lut. In the 
+        other modes lut is the tone mapping (or None, see _tone_lut), and 
+        then every pixel is turned into a dot or no dot by 
+        comparing it with a threshold (or a dither matrix), and the dots of 
+        each cell are packed into the bits of the index (see _cell_bits).'''
+        
+        if self._mode == "ascii":
+            return lut[tile]
+        if lut is not None: #the tone mapping, see _encoded_tiles
+            tile = lut[tile]
+        
+        cell_width, cell_height = self.render_modes[self._mode]
+        rows = -(-tile.shape[0] // cell_height)
+        cols = -(-tile.shape[1] // cell_width)
+        if tile.shape != (rows * cell_height, cols * cell_width):
+            #filling up the last cells with white if the image doesn't fit
+            tile = np.pad(tile, ((0, rows * cell_height - tile.shape[0]),
+                                 (0, cols * cell_width - tile.shape[1])),
+                          constant_values=255)
+        if self._dither:
+            #(b + 0.5) * 16 spreads the 16 thresholds evenly over 0-255
+            thresholds = np.array(self._bayer, dtype=np.uint8) * 16 + 8
+            thresholds = np.tile(thresholds, (-(-tile.shape[0] // 4), 
+                                              -(-tile.shape[1] // 4)))
+            dots = tile < thresholds[:tile.shape[0], :tile.shape[1]]
+        else:
+            dots = tile < 128
+        
+        #each dot is shifted into its bit of the index with strided views, 
+        #so no array is made per cell
+        dots = dots.view(np.uint8)
+        indexes = np.zeros((rows, cols), dtype=np.uint8)
+        for dot, bit in enumerate(self._cell_bits[self._mode]):
+            row, col = divmod(dot, cell_width)
+            indexes |= dots[row::cell_height, col::cell_width] << bit
+        return indexes
+    
+    def _encode_tile(self, tile, lut, glyphs, newline, encoding="utf-8"):
+        '''Method to convert one horizontal tile of pixels into the encoded 
+        bytes of the corresponding ascii rows, each row ending with newline.
+        Everything is done with numpy indexing which releases the GIL, so the
+        tiles can be encoded on several threads at the same time.'''
+        
+        indexes = self._tile_indexes(tile, lut)
+        rows, cols = indexes.shape
+        table, used = glyphs
+        letters = np.take(table, indexes, axis=0).reshape(rows, -1)
+        encoded = np.empty((rows, letters.shape[1] + len(newline)), 
+                           dtype=np.uint8)
+        encoded[:, :letters.shape[1]] = letters
+        encoded[:, letters.shape[1]:] = np.frombuffer(newline, dtype=np.uint8)
+        if not used.all():
+            #letters of different lengths: the padding is masked away
+            mask = np.ones(encoded.shape, dtype=bool)
+            mask[:, :letters.shape[1]] = np.take(used, indexes, 
+                                                 axis=0).reshape(rows, -1)
+            return encoded[mask].tobytes()
+        return encoded.tobytes()
+    
+    def _encoded_tiles(self, newline=b"\n", workers=None, encoding="utf-8"):
+        '''Method that splits the image into horizontal tiles and encodes 
+        them on a thread pool. The encoded chunks are returned in the same 
+        order as the rows in the image. Small images are encoded directly 
+        since the thread pool would only add overhead.'''
+        
+        return list(self._stream_tiles(newline, workers, encoding, 
+                                       tile_pixels=None))
+    
+    def _stream_tiles(self, newline=b"\n", workers=None, encoding="utf-8",
+                      tile_pixels=None):
+        '''Method to encode the tiles of the image like _encoded_tiles, but 
+        yielding each encoded tile as soon as it and the tiles before it are
+        done. Only a few tiles are encoded ahead of the one being yielded, 
+        and with tile_pixels no tile has more pixels than that (about), so 
+        the whole art never has to be in memory at once.'''
+        
+        pixels = np.asarray(self._image)
+        #the other modes only need the tone mapping before the thresholds
+        lut = self._index_lut() if self._mode == "ascii" else self._tone_lut()
+        glyphs = self._glyph_table(encoding)
+        
+        if workers is None:
+            workers = os.cpu_count() or 1
+        parallel = workers > 1 and pixels.size >= self._min_parallel_pixels
+        
+        # a few tiles per worker so that one slow tile doesn't stall the rest.
+        # The tiles are made of whole cells and line up with the dither matrix
+        tile_rows = pixels.shape[0]
+        if parallel:
+            tile_rows = -(-pixels.shape[0] // (workers * 4))
+        if tile_pixels:
+            tile_rows = min(tile_rows, tile_pixels // max(1, pixels.shape[1]))
+        step = 1 if self._mode == "ascii" else 4
+        tile_rows = -(-max(1, tile_rows) // step) * step
+        tiles = (pixels[row:row + tile_rows] 
+                 for row in range(0, pixels.shape[0], tile_rows))
+        encode = lambda tile: self._encode_tile(tile, lut, glyphs, newline, 
+                                                encoding)
+        if not parallel:
+            yield from map(encode, tiles)
+            return
+        
+        from collections import deque
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for tile in tiles:
+                pending.append(executor.submit(encode, tile))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
      
+    # below this number of pixels the image is rendered on a single thread
+    _min_parallel_pixels = 250_000
+    
+    # the most pixels in each tile when the art is streamed to a compressor
+    _stream_tile_pixels = 1 << 20
    
-    def render(self, out = False):
+    # the writer method for each file extension that isn't written as plain
+    # text. New output formats are added by adding a method and its extension
+    output_encoders = {
+        ".gz": "_write_gzip",
+        ".zst": "_write_zstd",
+        ".pidx": "_write_packed",
+        ".png": "_write_png"
+    }
+    
+    def render(self, out = False, workers = None, pager = False):
         '''Method to render an image to ASCII art based on the attributes 
         it currently has. If an argument for out is provided, the rendered art
         will be saved to a new file with the same name as the one provided for 
-        the argument. Default is .txt if user does not specify format.
+        the argument. Default is .txt if user does not specify format. The 
+        extensions in output_encoders are written in their own format instead:
+        gzip or zstd compressed text, packed gscale indexes or a png image of
+        the text. Without out, the art is written to the console, or shown 
+        in a pager (such as less) if pager is True.
        
-        The method works by converting the pixels to an array, normalizing their 
-        values to fit the gscale length and then using the values  as indeces 
-        for the corresponding element in gscale.
+        The method works by looking up the gscale index of every grey value 
+        in a precomputed table and then using the indexes to pick the encoded
+        letters for each row. Large images are split into horizontal tiles 
+        which are encoded on a thread pool with workers threads (defaults to
+        the number of cpus) and then written in order.
         '''
-        greyscale_array= self.__normalize(np.asarray(self._image))
-        #creating an np.array and normalizing values
-      
-        int_array = (np.rint(greyscale_array).astype(int)) 
-        # rounding to nearest integer and converting to int
-        
-        ascii_array = self.__vectorize_index(self, int_array)
-        #this is an array where each value is the corresponding gscale letter
-        
-        strings = ascii_array.view('U' + str(ascii_array.shape[1])).flatten()
-        #the strings object is an array with one column and where each row contains
-        #all the letters for the corresponding row in ascii_array
         if out:
             if "." not in out:
                 out += ".txt"
-            with open(out, "w") as out_file:
-                print("\n".join(strings), file=out_file)
+            extension = os.path.splitext(out)[1].lower()
+            writer = getattr(self, self.output_encoders.get(extension, 
+                                                            "_write_text"))
+            writer(out, workers)
+        elif pager:
+            chunks = self._encoded_tiles(workers=workers)
+            import pydoc
+            pydoc.pager(b"".join(chunks).decode())
         else:
-            print("\n".join(strings))
+            self._write_console(workers)
+            
+    # number of bytes written to the console per call
+    _console_chunk_size = 1 << 16
+    
+    def _write_console(self, workers=None):
+        '''Method to write the art to the console. Instead of printing it as
+        one huge string, the encoded bytes are written straight to the binary
+        buffer of sys.stdout in chunks of _console_chunk_size bytes, which 
+        keeps the terminal busy without the overhead of text conversion. If 
+        sys.stdout has no binary buffer (as in some IDEs) the text is written
+        with sys.stdout.write instead.'''
+        
+        stdout = sys.stdout
+        encoding = getattr(stdout, "encoding", None) or "utf-8"
+        art = b"".join(self._encoded_tiles(workers=workers, 
+                                           encoding=encoding))
+        buffer = getattr(stdout, "buffer", None)
+        if buffer is None:
+            stdout.write(art.decode(encoding, errors="replace"))
+            return
+        
+        stdout.flush() #so that earlier prints come before the art
+        view = memoryview(art)
+        for start in range(0, len(view), self._console_chunk_size):
+            buffer.write(view[start:start + self._console_chunk_size])
+        buffer.flush()
+        
+    @staticmethod
+    def _terminal_width():
+        '''Method to get the number of columns that fit in the console 
+        window. One column is left empty since some terminals wrap the line 
+        when the last column is written. Falls back to 80 columns when the 
+        size can't be found, and never goes below 10.'''
+        import shutil
+        columns = shutil.get_terminal_size((80, 24)).columns
+        return max(10, columns - 1)
+            
+    def _write_text(self, out, workers=None):
+        '''Method to write the art as plain text with the line endings of 
+        the operating system'''
+        chunks = self._encoded_tiles(os.linesep.encode(), workers)
+        with open(out, "wb") as out_file:
+            if hasattr(os, "writev"):
+                self._writev_all(out_file.fileno(), chunks)
+            else:
+                out_file.writelines(chunks)
+                
+    def _write_gzip(self, out, workers=None):
+        '''Method to write the art as gzip compressed text. The tiles are 
+        streamed to the compressor as they are encoded (see _stream_tiles)'''
+        import gzip
+        with gzip.open(out, "wb", compresslevel=6) as out_file:
+            out_file.writelines(self._stream_tiles(
+                workers=workers, tile_pixels=self._stream_tile_pixels))
+            
+    def _write_zstd(self, out, workers=None):
+        '''Method to write the art as zstd compressed text, streamed to the
+        compressor like in _write_gzip. This needs the optional zstandard 
+        module'''
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("Writing .zst files requires the zstandard "
+                              "module. Install it with 'pip install "
+                              "zstandard'") from None
+        
+        compressor = zstandard.ZstdCompressor(level=3)
+        with open(out, "wb") as out_file, \
+            compressor.stream_writer(out_file, closefd=False) as writer:
+            for chunk in self._stream_tiles(
+                    workers=workers, tile_pixels=self._stream_tile_pixels):
+                writer.write(chunk)
+                
+    # file signature for the packed index format, see _write_packed
+    _packed_magic = b"AAS7"
+    # number of cells packed at a time, must be a multiple of 8
+    _packed_chunk_cells = 1 << 20
+    
+    def _write_packed(self, out, workers=None):
+        '''Method to write the gscale index of every cell with 7 bits per 
+        cell instead of a whole letter. The file starts with the signature 
+        AAS7, the width and height (4 byte little endian each), the number 
+        of bytes in gscale (2 bytes) and gscale itself in utf-8. After that 
+        comes the indexes row by row, packed with the most significant bit 
+        first. This only works for a gscale with at most 128 letters.'''
+        
+        if self._mode != "ascii":
+            raise ValueError("The packed format only works in ascii mode")
+        if len(self.gscale) > 128:
+            raise ValueError("The packed format can only store a gscale with"
+                             " at most 128 letters")
+        indexes = self._index_lut().astype(np.uint8)[
+            np.asarray(self._image)].ravel()
+        ramp = self.gscale.encode("utf-8")
+        height, width = np.asarray(self._image).shape[:2]
+        shifts = np.arange(49, -1, -7, dtype=np.uint64)
+        
+        with open(out, "wb") as out_file:
+            out_file.write(self._packed_magic)
+            out_file.write(struct.pack("<IIH", width, height, len(ramp)))
+            out_file.write(ramp)
+            for start in range(0, indexes.size, self._packed_chunk_cells):
+                chunk = indexes[start:start + self._packed_chunk_cells]
+                # 8 indexes of 7 bits fit in the lowest 7 bytes of a uint64
+                groups = np.zeros(-(-chunk.size // 8) * 8, dtype=np.uint64)
+                groups[:chunk.size] = chunk
+                packed = np.bitwise_or.reduce(
+                    groups.reshape(-1, 8) << shifts, axis=1)
+                out_file.write(packed.astype(">u8").view(np.uint8).reshape(
+                    -1, 8)[:, 1:].tobytes())
+                
+    @classmethod
+    def read_packed(cls, filename):
+        '''Method to read a file written in the packed index format and 
+        return the art as text, with the rows separated by newlines'''
+        
+        with open(filename, "rb") as file:
+            if file.read(4) != cls._packed_magic:
+                raise ValueError(f"{filename} is not a packed ASCII art file")
+            width, height, ramp_length = struct.unpack("<IIH", file.read(10))
+            ramp = file.read(ramp_length).decode("utf-8")
+            packed = np.frombuffer(file.read(), dtype=np.uint8)
+        
+        bits = np.unpackbits(packed)[:width * height * 7].reshape(-1, 7)
+        indexes = np.packbits(bits, axis=1)[:, 0] >> 1 #7 bits padded to 8
+        letters = np.array(list(ramp))[indexes].reshape(height, width)
+        return "\n".join("".join(row) for row in letters)
+    
+    def _glyph_atlas(self):
+        '''Method to draw every letter in gscale with Pillow's default font
+        as dark text on a white background. All letters are drawn in cells 
+        of the same size so that the picture of the art can be put together 
+        with numpy indexing. Returns an array (letters, height, width)'''
+        
+        font = ImageFont.load_default()
+        ascent, descent = font.getmetrics()
+        cell_width = max(int(np.ceil(font.getlength(letter))) 
+                         for letter in self.gscale)
+        atlas = np.empty((len(self.gscale), ascent + descent, cell_width),
+                         dtype=np.uint8)
+        for index, letter in enumerate(self.gscale):
+            cell = Image.new("L", (cell_width, ascent + descent), 255)
+            ImageDraw.Draw(cell).text((0, 0), letter, fill=0, font=font)
+            atlas[index] = np.asarray(cell)
+        return atlas
+    
+    def _write_png(self, out, workers=None):
+        '''Method to save a picture of the rendered art as a png image'''
+        
+        if self._mode != "ascii":
+            raise ValueError("Png images can only be saved in ascii mode")
+        atlas = self._glyph_atlas()
+        indexes = self._index_lut()[np.asarray(self._image)]
+        rows, cols = indexes.shape
+        cells = atlas[indexes] #(rows, cols, cell height, cell width)
+        picture = cells.transpose(0, 2, 1, 3).reshape(
+            rows * atlas.shape[1], cols * atlas.shape[2])
+        Image.fromarray(picture).save(out, format="PNG")
+    
+    @staticmethod
+    def _writev_all(fd, chunks):
+        '''Method to write all chunks to the file descriptor fd with as few
+        system calls as possible. os.writev can write fewer bytes than asked 
+        for, so the remaining part is written in a loop.'''
+        
+        views = [memoryview(chunk) for chunk in chunks if chunk]
+        max_chunks = getattr(os, "IOV_MAX", None) or 1024
+        while views:
+            written = os.writev(fd, views[:max_chunks])
+            while views and written >= len(views[0]):
+                written -= len(views[0])
+                views.pop(0)
+            if views and written:
+                views[0] = views[0][written:]
                   
-    # the piece of code for printing the array is credited to stackoverflow:
+    # the idea of viewing each row as one string is credited to stackoverflow:
     #https://stackoverflow.com/questions/9632995/how-to-easily-print-ascii-art-text
      #(its the last answer)   
  
@@ -183,11 +1364,90 @@ class SessionManager :
     interface between the actual user interface, and the individual Ascii_art
     objects.'''
  
-    def __init__(self):
+    def __init__(self, memory_budget=None):
         self.members=[]
         self._current = None
+        self._journal = None #open journal file of the saved session, if any
+        self._session_file = None
+        self._journal_records = 0
+        self._journal_failed = False #see _start_journal
+        self._journal_lock = threading.RLock() #the journal is also synced
+        self._sync_timer = None                #from a timer thread
+        self._last_used = {} #member -> time it was last used, see _use
+        self._spill_folder = None
+        if memory_budget is not None:
+            self.memory_budget = memory_budget
+        
+    # the most bytes the pixels of all members may take in memory before the
+    # least recently used members are released, see _enforce_budget
+    memory_budget = 512 * 2**20
+        
+    # the journal is synced to disk after this many records or seconds, and
+    # compacted into the session file after _journal_compact_every records
+    _journal_sync_every = 20
+    _journal_sync_seconds = 1.0
+    _journal_compact_every = 200
+    
+    # a session that has not been saved is journaled as this session file, 
+    # if it is set (see _start_journal), so it can be loaded after a crash
+    recovery_file = None
 
         
+    def _use(self, member):
+        '''method to mark member as the most recently used image, and then
+        keep the session within its memory budget'''
+        self._last_used[member] = time.monotonic()
+        self._enforce_budget(keep=member)
+        
+    def _memory_used(self, members=None):
+        '''method to get how many bytes the pixels of members (default all) 
+        take in memory. Images that are shared between members (see 
+        ASCII_art._shared) are only counted once.'''
+        held = {}
+        for member in self.members if members is None else members:
+            for item in member._held_images():
+                held[id(item)] = ASCII_art._held_bytes(item)
+        return sum(held.values())
+    
+    def _enforce_budget(self, keep=None):
+        '''method to release the least recently used members (except keep)
+        until the pixels of the session fit in memory_budget. A released
+        member is spilled to a .npy file in a temporary folder, or simply 
+        decoded again if its image hasn't been changed, and is loaded again 
+        the next time it is used (see ASCII_art.release)'''
+        if self._memory_used() <= self.memory_budget:
+            return
+        if self._spill_folder is None:
+            import shutil, tempfile
+            self._spill_folder = tempfile.mkdtemp(prefix="ascii_art_spill_")
+            #the folder is removed when the session is
+            weakref.finalize(self, shutil.rmtree, self._spill_folder, 
+                             ignore_errors=True)
+        
+        by_age = sorted((member for member in self.members 
+                         if member is not keep and member._held_images()),
+                        key=lambda member: self._last_used.get(member, 0))
+        for member in by_age:
+            member.release(self._spill_folder)
+            if self._memory_used() <= self.memory_budget:
+                break
+    
+    @staticmethod
+    def _size_text(size):
+        '''method to write a number of bytes in kB or MB'''
+        if size < 2**20:
+            return f"{size / 2**10:.1f} kB"
+        return f"{size / 2**20:.1f} MB"
+    
+    def _memory_info(self, member):
+        '''method to describe how much memory member uses, for info'''
+        size = self._size_text(self._memory_used([member]))
+        if member._spill_file:
+            return size + " (spilled to disk)"
+        if member._current_image is None:
+            return size + " (loaded when used)"
+        return size
+        
     def _check_target_size(self, member):
         '''method to check whether or not an object has a target size or not,
         which will be used in the info method'''
@@ -202,11 +1462,18 @@ class SessionManager :
         return target_size_info
     
 
+    def _crop_info(self, member):
+        '''method to describe the crop of an object for the info method'''
+        if not member._crop:
+            return "no crop"
+        left, top, right, bottom = member._crop
+        return f"{left}, {top}, {right - left}, {bottom - top}"
+
     def _find_img(self, img):
         '''Method ment to be used in whenever an user uses any command with 
         "set img".  Given the arugment "img"  as in the user provided "set img" 
         or "render img"  commands, this method checks the members if their file 
-        name or alias is equal to img while also checking for duplicates. 
+        name, path or alias is equal to img while also checking for duplicates.
         If img  is "current", it returns the current image. '''
         
         if img == "current":
@@ -215,7 +1482,7 @@ class SessionManager :
         matches = 0
         for member in self.members:
             if (hasattr(member, "alias") and member.alias==img) or \
-            member._file_name == img:
+            member._file_name == img or member._image_path == img:
                 matches +=1
                 matched_member = member
             
@@ -228,6 +1495,60 @@ class SessionManager :
         else:
             return matched_member
             
+    def _find_imgs(self, pattern):
+        '''Method to find all images matching pattern, which can be "all" for
+        every image, a glob pattern such as "img*" that is matched against 
+        the file names and aliases, or a single name as in _find_img.'''
+        
+        if pattern == "all":
+            return list(self.members)
+        if not any(char in pattern for char in "*?["):
+            return [self._find_img(pattern)]
+        
+        matched = [member for member in self.members 
+                   if fnmatch.fnmatch(member._file_name, pattern) or (
+                       hasattr(member, "alias") and 
+                       fnmatch.fnmatch(member.alias, pattern))]
+        if not matched:
+            raise NameError(f"No image was found matching '{pattern}'")
+        return matched
+    
+    def _set_imgs(self, changes):
+        '''Method to apply a list of changes (img, attribute, value) where 
+        img can be a pattern as in _find_imgs. All names are looked up before
+        anything is changed, so if one of them is invalid nothing is changed.
+        The changes are then merged per image (the last change of an 
+        attribute wins, and so does the last of width and height since the 
+        other one follows from it) and applied with one apply_settings call 
+        per image, on a thread pool when there are several images.'''
+        
+        settings = {}
+        for img, attribute, value in changes:
+            if attribute not in ["width", "height", "brightness", "contrast",
+                                 "tone", "gamma"]:
+                raise NameError(f"Invalid attribute '{attribute}'.")
+            for member in self._find_imgs(img):
+                member_settings = settings.setdefault(member, {})
+                if attribute in ["width", "height"]:
+                    member_settings.pop("width", None)
+                    member_settings.pop("height", None)
+                member_settings[attribute] = value
+        
+        if len(settings) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor() as executor:
+                list(executor.map(lambda item: item[0].apply_settings(**item[1]),
+                                  settings.items()))
+        else:
+            for member, member_settings in settings.items():
+                member.apply_settings(**member_settings)
+        
+        if len(settings) == 1:
+            self._current = next(iter(settings))
+        for member in settings:
+            self._journal_change(member)
+            self._use(member)
+            
     def _info(self):
         '''Method to display an overview of the session such as what images are 
         loaded and their attributes, as well as the current image.'''
@@ -245,9 +1566,16 @@ class SessionManager :
                 f"    filename: {member._file_name}\n"
                 f"    size (width, height): ({member._width}, {member._height})\n"
                 f"    target size: {target_size_info}\n"
+                f"    crop (x, y, width, height): {self._crop_info(member)}\n"
+                f"    mode: {member._mode}"
+                f"{' (dithered)' if member._dither else ''}\n"
                 f"    brightness: {member._brightness}\n"
-                f"    contrast: {member._contrast}\n") 
+                f"    contrast: {member._contrast}\n"
+                f"    tone: {member._tone}, gamma: {member._gamma}\n"
+                f"    memory: {self._memory_info(member)}\n") 
         
+        print(f"Memory used: {self._size_text(self._memory_used())} of "
+              f"{self._size_text(self.memory_budget)}\n")
         if hasattr(self._current, "alias"):
             print("Current image: ", self._current.alias, "\n")
         else:
@@ -257,20 +1585,26 @@ class SessionManager :
         #"how to print object attributes in a for loop and check if they have 
         #specific attributes in python"
         
-    def _load_image(self, file, alias = False, set_width = True):
+    def _load_image(self, file, alias = False, set_width = True, 
+                    raw_size = None, raw_dtype = "uint8"):
         '''Method to load an image as an ASCII_art object to the session while
-        also automatically sets the new width to 50 as default'''
+        also automatically sets the new width to 50 as default. raw_size and
+        raw_dtype are passed on to ASCII_art for headerless raw files'''
         try:
-            ascii_object = ASCII_art(file)
+            ascii_object = ASCII_art(file, raw_size, raw_dtype)
             if alias:
                 ascii_object.alias = alias
             if set_width:
                 ascii_object.resize(new_width=50)
             self.members.append(ascii_object)
             self._current = ascii_object
+            self._journal_change(ascii_object)
+            self._use(ascii_object)
         except (FileNotFoundError, OSError):
             print(f"No image was found with the filename: {file}. "
                   "Please try again")   
+        except ValueError as err_message:
+            print(err_message)
     
     def _load_json(self, filename):
         '''method to load and return a json file. This is used for the 
@@ -281,45 +1615,119 @@ class SessionManager :
         with open(filename, "r") as file:
             return(json.load(file))
               
+    def _journal_name(self, filename):
+        '''method to get the name of the journal that belongs to the session
+        file filename, which is the same name but with .jsonl'''
+        return os.path.splitext(filename)[0] + ".jsonl"
+    
+    def _read_journal(self, filename, session_data):
+        '''method to replay the journal of a session on the data loaded from
+        the session file. Every line in the journal is one change: the member
+        at "index" gets the data in "member" (an index one past the end adds 
+        a new member) and "current" is the index of the current image. A 
+        last line that was only partly written before a crash is skipped.'''
+        
+        try:
+            with open(self._journal_name(filename), "r") as file:
+                lines = file.readlines()
+        except FileNotFoundError:
+            return 0
+        
+        members = session_data["members"]
+        for line_number, line in enumerate(lines):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                if line_number != len(lines) - 1:
+                    raise
+                #removing the broken line so new changes can be added after
+                lines.pop()
+                with open(self._journal_name(filename), "w") as file:
+                    file.writelines(lines)
+                break
+            if record.get("member") is not None:
+                if record["index"] == len(members):
+                    members.append(record["member"])
+                else:
+                    members[record["index"]] = record["member"]
+            session_data["current_index"] = record["current"]
+        return len(lines)
+              
     def _load_session(self, filename):
         '''Method to load a saved session in json format. This does not load
         any pixel data; instead it checks the saved data for the file names and 
         converts them into new ASCII-art objects while also reapplying any 
-        saved changes and keeps track of current image'''
+        saved changes and keeps track of current image. Changes in the 
+        journal of the session (see _save_session) are replayed first so 
+        that only the final settings of each image are applied, and later
+        changes are added to the same journal, which is only opened when the
+        first change is made (see _start_journal).'''
     
         session_data = self._load_json(filename)
+        if not filename.endswith(".json"):
+            filename += ".json"
+        journal_records = self._read_journal(filename, session_data)
+        self._close_journal()
         self.members = []
         self._current = None
+        self._last_used = {}
 
         for member_data in session_data["members"]:
-            ascii_object = ASCII_art(member_data["file_name"])
+            ascii_object = ASCII_art(self._session_path(member_data),
+                                     member_data.get("raw_size"),
+                                     member_data.get("raw_dtype", "uint8"))
+            if member_data.get("digest") not in [None, ascii_object._digest]:
+                print(f"Note: {ascii_object._file_name} has changed since "
+                      "the session was saved")
             if member_data["alias"]:
                 ascii_object.alias = member_data["alias"]
-            if member_data["target_width"] is not None and member_data[
-                    "target_height"] is not None:
-                ascii_object.resize(
-                    new_width=member_data["target_width"],
-                    new_height=member_data["target_height"]
-                )
-            ascii_object.image_enhance("brightness", member_data["brightness"])
-            ascii_object.image_enhance("contrast", member_data["contrast"])
+            if member_data.get("mode"):
+                ascii_object.set_mode(member_data["mode"], 
+                                      member_data.get("dither", False))
+            if member_data.get("crop"):
+                left, top, right, bottom = member_data["crop"]
+                ascii_object.crop(left, top, right - left, bottom - top)
+            ascii_object.apply_settings(
+                width=member_data["target_width"],
+                height=member_data["target_height"],
+                brightness=member_data["brightness"],
+                contrast=member_data["contrast"],
+                tone=member_data.get("tone", "off"),
+                gamma=member_data.get("gamma", 1))
             self.members.append(ascii_object)
+            self._use(ascii_object)
 
-        if session_data["current"]:
+        if session_data.get("current_index") is not None:
+            self._current = self.members[session_data["current_index"]]
+        elif session_data["current"]:
             for member in self.members:
                 if member._file_name == session_data["current"]:
                     self._current = member
                     break
             else:
                 print("Could not find the specified current image.")  
+        self._session_file = filename
+        self._journal_records = journal_records
+        self._journal_failed = False
 #Note: this load session and save session method further below
 #were done with help from ChatGpt
                 
-    def _render_img(self, img=False, filename= False):
+    def _session_path(self, member_data):
+        '''method to get the file of a member in a saved session. The full 
+        path is used if it still exists, since two images in different 
+        folders can have the same file name. Older sessions only have the 
+        file name, which is looked for in the working directory.'''
+        path = member_data.get("path")
+        if path and os.path.exists(path):
+            return path
+        return member_data["file_name"]
+                
+    def _render_img(self, img=False, filename= False, pager = False):
         '''method to render an image based on the render method from the 
         ASCII_art class. img is the image to be rendered; if not specified
         it will be current image. Filename is the name of the out file to render
-        to; if not specified the image will only be printed to console.'''
+        to; if not specified the image will only be printed to console, or
+        shown in a pager if pager is True.'''
         
         try:
             if not img:
@@ -329,40 +1737,214 @@ class SessionManager :
             if filename:
                 img.render(out=filename)
             else:
-                img.render()
+                img.render(pager=pager)
+            self._use(img)
             if self._current != img:
                 self._current = img
+                self._journal_change()
                 
-        except NameError as err_message:
+        except (NameError, ImportError, ValueError) as err_message:
             print(err_message) 
             
 
+    def _member_data(self, member):
+        '''method to get the attributes of an ascii_art object that are saved
+        in a session'''
+        member_data = {
+            "file_name": member._file_name,
+            "path": os.path.abspath(member._image_path),
+            "digest": member._digest,
+            "alias": member.alias if hasattr(member, "alias") else None,
+            "target_width": getattr(member, "_target_width", None),
+            "target_height": getattr(member, "_target_height", None),
+            "brightness": member._brightness,
+            "contrast": member._contrast,
+            }
+        if member._crop:
+            member_data["crop"] = list(member._crop)
+        if member._tone != "off" or member._gamma != 1:
+            member_data["tone"] = member._tone
+            member_data["gamma"] = member._gamma
+        if member._mode != "ascii":
+            member_data["mode"] = member._mode
+            member_data["dither"] = member._dither
+        if member._raw_size:
+            member_data["raw_size"] = list(member._raw_size)
+            member_data["raw_dtype"] = member._raw_dtype
+        return member_data
+    
+    def _current_index(self):
+        return self.members.index(self._current) if self._current else None
+
     def _save_session(self, filename):
         '''method to save the session such as the ascii_art objects and their
         attributes, as well as the session specific current. The data is saved
-        as a json file'''
+        as a json file. 
+        
+        After the session has been saved, every change is also appended to a
+        journal with the same name but ending with .jsonl (see _journal_change)
+        so nothing is lost if the program crashes. Saving again to the same 
+        file then only has to make sure that the journal is on disk.'''
         
         if not filename.endswith(".json"):
             filename += ".json"
-            
+        if filename == self._session_file and filename != self.recovery_file \
+            and not self._journal_failed:
+            if self._journal is not None:
+                self._sync_journal()
+            return
+        recovering = self._session_file is not None and \
+            self._session_file == self.recovery_file
+        self._close_journal()
+        self._write_snapshot(filename)
+        self._journal_failed = False
+        self._open_journal(filename)
+        if recovering:
+            self._remove_recovery()
+        
+    def _write_snapshot(self, filename):
+        '''method to write the whole session to filename. The file is first 
+        written under a temporary name and then renamed, so a crash while 
+        writing never leaves a half written session'''
+        
         session_data = {
-        "members": [],
+        "members": [self._member_data(member) for member in self.members],
         "current": self._current._file_name if self._current else None,
+        "current_index": self._current_index(),
     }
-        for member in self.members:
-            member_data = {
-                "file_name": member._file_name,
-                "alias": member.alias if hasattr(member, "alias") else None,
-                "target_width": getattr(member, "_target_width", None),
-                "target_height": getattr(member, "_target_height", None),
-                "brightness": member._brightness,
-                "contrast": member._contrast,
-                }
-            session_data["members"].append(member_data)
-        with open(filename, "w") as f:
+        temporary = filename + ".tmp"
+        with open(temporary, "w") as f:
             json.dump(session_data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, filename)
+        
+    def _open_journal(self, filename, records=0):
+        '''method to start appending changes to the journal of the session
+        file filename. records is the number of records already in it'''
+        self._session_file = filename
+        self._journal = open(self._journal_name(filename), 
+                             "a" if records else "w")
+        self._journal_records = records
+        self._unsynced_records = 0
+        self._last_sync = time.monotonic()
+        
+    def _start_journal(self):
+        '''method to open the journal when the first change is made after 
+        the session was loaded, see _open_journal. A session that has not 
+        been saved is journaled as recovery_file, if it is set, starting 
+        with a snapshot of the session. Returns True if the journal is open.
+        If it can't be opened, the reason is printed once and the changes 
+        are only kept in memory until the session is saved.'''
+        
+        if self._journal_failed:
+            return False
+        try:
+            if self._session_file is not None:
+                self._open_journal(self._session_file, self._journal_records)
+            elif self.recovery_file:
+                self._write_snapshot(self.recovery_file)
+                self._open_journal(self.recovery_file)
+        except OSError as err_message:
+            self._journal_failed = True
+            print("Note: the changes can't be written to the journal, so "
+                  f"they are lost if the program crashes: {err_message}")
+        return self._journal is not None
+    
+    def _remove_recovery(self):
+        '''method to remove the recovery session and its journal, see 
+        _start_journal'''
+        for filename in [self.recovery_file, 
+                         self._journal_name(self.recovery_file)]:
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+    
+    def _end_session(self):
+        '''method to close the journal when the program quits. A session 
+        that was never saved is discarded, so its recovery session is 
+        removed.'''
+        recovering = self._session_file is not None and \
+            self._session_file == self.recovery_file
+        self._close_journal()
+        if recovering:
+            self._remove_recovery()
+    
+    def _sync_journal(self):
+        '''method to make sure everything written to the journal is on disk'''
+        with self._journal_lock:
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._unsynced_records = 0
+            self._last_sync = time.monotonic()
+            
+    def _schedule_sync(self):
+        '''method to start a timer that syncs the journal after 
+        _journal_sync_seconds, so a change is on disk by then even if no 
+        other change comes after it'''
+        if self._sync_timer is None:
+            self._sync_timer = threading.Timer(self._journal_sync_seconds, 
+                                               self._timed_sync)
+            self._sync_timer.daemon = True
+            self._sync_timer.start()
+            
+    def _timed_sync(self):
+        '''method run by the timer from _schedule_sync'''
+        with self._journal_lock:
+            self._sync_timer = None
+            if self._journal is not None and self._unsynced_records:
+                self._sync_journal()
+        
+    def _close_journal(self):
+        '''method to sync and close the journal, if there is one open'''
+        with self._journal_lock:
+            if self._sync_timer is not None:
+                self._sync_timer.cancel()
+                self._sync_timer = None
+            if self._journal is not None:
+                self._sync_journal()
+                self._journal.close()
+                self._journal = None
+        
+    def _journal_change(self, member=None):
+        '''method to append a change to the journal if the session has been 
+        saved or loaded, or to the journal of the recovery session if it 
+        hasn't (see _start_journal). The record holds the saved attributes of member (if given) and
+        the current image. To not wait for the disk on every change, the 
+        journal is only synced every _journal_sync_every records or after
+        _journal_sync_seconds seconds (by a timer if no other change comes,
+        see _schedule_sync), and when it has grown to 
+        _journal_compact_every records it is compacted by saving the whole
+        session and starting an empty journal.'''
+        
+        with self._journal_lock:
+            if self._journal is not None or self._start_journal():
+                self._write_record(member)
+                
+    def _write_record(self, member):
+        '''method to write one record to the journal, see _journal_change'''
+        record = {
+            "index": self.members.index(member) if member else None,
+            "member": self._member_data(member) if member else None,
+            "current": self._current_index(),
+            }
+        self._journal.write(json.dumps(record) + "\n")
+        self._journal.flush()
+        self._journal_records += 1
+        self._unsynced_records += 1
+        
+        if self._journal_records >= self._journal_compact_every:
+            filename = self._session_file
+            self._close_journal()
+            self._write_snapshot(filename)
+            self._open_journal(filename)
+        elif self._unsynced_records >= self._journal_sync_every or \
+            time.monotonic() - self._last_sync >= self._journal_sync_seconds:
+            self._sync_journal()
+        else:
+            self._schedule_sync()
                         
-
        
     def _set_img_dim(self, img, attribute, value):
         '''Method to change the dimension of an image given the alias or filename as 
@@ -377,8 +1959,43 @@ class SessionManager :
             
         if self._current != img_object:
             self._current = img_object
+        self._journal_change(img_object)
+        self._use(img_object)
 
             
+    def _set_img_crop(self, img, box=None, zoom=None):
+        '''Method to crop an image given the alias or filename as the argument
+        "img", either to box (x, y, width, height) or zoomed in by the factor
+        zoom around the middle. Without box or zoom the crop is removed.'''
+        img_object = self._find_img(img)
+        if zoom:
+            img_object.zoom(zoom)
+        elif box:
+            img_object.crop(*box)
+        else:
+            img_object.crop()
+        if self._current != img_object:
+            self._current = img_object
+        self._journal_change(img_object)
+        self._use(img_object)
+        
+    def _set_img_mode(self, img, mode=None, dither=None):
+        '''Method to change the render mode (and/or dithering) of an image 
+        given the alias or filename as the argument "img"'''
+        img_object = self._find_img(img)
+        img_object.set_mode(mode or img_object._mode, dither)
+        if self._current != img_object:
+            self._current = img_object
+        self._journal_change(img_object)
+        self._use(img_object)
+        
+    def _set_memory_budget(self, megabytes):
+        '''Method to change the memory budget of the session (in MB) and 
+        release images right away if they no longer fit'''
+        self.memory_budget = int(megabytes * 2**20)
+        self._enforce_budget(keep=self._current)
+        print(f"Memory budget set to {megabytes:g} MB")
+        
     def _set_img_enhance(self, img, attribute, value):
         '''Method to enhance image contrast or brightness based on the 
         enhanct method for ASCII objects. '''
@@ -391,6 +2008,8 @@ class SessionManager :
             raise NameError("Invalid attribute. Use 'brightness' or 'contrast'") 
         if  self._current != img_object:
             self._current = img_object
+        self._journal_change(img_object)
+        self._use(img_object)
                             
 
 
@@ -404,9 +2023,11 @@ class ASCII_UserInterface:
     
  '''    
     def __init__(self):
+        '''Creating the user interface does not start it, so that the classes
+        can be used from other programs. Call run_program to start it'''
         self.session_manager = SessionManager()
         self._current_image = None
-        self.run_program()
+        self._pending = None #set commands waiting for commit, see begin
              
     #crating dictionary as class attribute  with all valid commands and their
     #corresponding method to handle said command    
@@ -417,16 +2038,31 @@ class ASCII_UserInterface:
         "render": "_handle_render_cmd",
         "save": "_handle_save_cmd",
         "set": "_handle_set_cmd",
+        "begin": "_handle_begin_cmd",
+        "commit": "_handle_commit_cmd",
+        "rollback": "_handle_rollback_cmd",
+        "run": "_handle_run_cmd",
         "quit": "_handle_quit_cmd"
     }
+    # the handler methods for these commands do not take any input argument
+    no_argument_commands = ["quit", "info", "help", "begin", "commit", 
+                            "rollback"]
             
     def run_program(self):
         '''This is the method for the user command prompt interface. When started
         this will always require an user input. if the user command is valid, then 
-        it is passed on the the method to handle that specific command'''
+        it is passed on the the method to handle that specific command. 
+        Changes to a session that has not been saved yet are journaled in 
+        recovery_session.json (see SessionManager._start_journal), which is
+        removed again when the program quits normally.'''
         
         print("Welcome to ASCII Art Studio! If you need help to see all valid "
               "commands, type 'help'. To exit, type 'quit' ")
+        self.session_manager.recovery_file = "recovery_session.json"
+        if os.path.exists(self.session_manager.recovery_file):
+            print("The last session was not saved before the program stopped."
+                  " Type 'load session recovery_session' to get it back "
+                  "before making any changes, which would replace it.")
         self._run = True #so loop can break from within quit method
         while self._run:
             user_input = input("AAS: ").lower().split()
@@ -434,25 +2070,31 @@ class ASCII_UserInterface:
             if not user_input:
                 print("No command given. Please try again")
                 continue
+            self._execute(user_input)
             
-            user_cmd = user_input[0]
-            self._cmd = user_cmd
-            self._input_len = len(user_input)
-            
-            if self._print_if_no_image(user_cmd): #this will print an error if
-                continue  # an user tries some methods before image is loaded
+    def _execute(self, user_input):
+        '''Method to pass one command, already split into words, on to the 
+        method that handles that specific command'''
+        
+        user_cmd = user_input[0]
+        self._cmd = user_cmd
+        self._input_len = len(user_input)
+        
+        #the memory budget can be set before loading the images
+        if (user_cmd, *user_input[1:2]) != ("set", "memory") and \
+            self._print_if_no_image(user_cmd): #this will print an error if
+            return  # an user tries some methods before image is loaded
 
-            if user_cmd in self.command_handlers:
-                handle_method_name = self.command_handlers[user_cmd]
-                handle_method = getattr(self, handle_method_name)
+        if user_cmd in self.command_handlers:
+            handle_method_name = self.command_handlers[user_cmd]
+            handle_method = getattr(self, handle_method_name)
 
-                if user_cmd in ["quit", "info", "help"]: # The handler methods 
-                #for these do not take any input argument.
-                    handle_method()  # Call method without arguments
-                else:
-                    handle_method(user_input)  # Call method with arguments
+            if user_cmd in self.no_argument_commands:
+                handle_method()  # Call method without arguments
             else:
-                print("Invalid command given")
+                handle_method(user_input)  # Call method with arguments
+        else:
+            print("Invalid command given")
     
                                 
     def _print_error(self, err_message="", invalid_args = False):
@@ -524,8 +2166,8 @@ class ASCII_UserInterface:
                       f"format not valid with Json")
             except MemoryError:
                 print(f"Not enough memory to load the file {session_file}")
-            except PermissionError:(f"No permission to read the file "
-                                   f"'{session_file}'")
+            except PermissionError:
+                print(f"No permission to read the file '{session_file}'")
             except Exception as e:
                 print(f"An error occurred while loading the session file "
                       f"'{session_file}': {e}")
@@ -548,9 +2190,20 @@ class ASCII_UserInterface:
                 f"    filename: {member._file_name}\n"
                 f"    size (width, height): ({member._width}, {member._height})\n"
                 f"    target size: {target_size_info}\n"
+                f"    crop (x, y, width, height): "
+                f"{self.session_manager._crop_info(member)}\n"
+                f"    mode: {member._mode}"
+                f"{' (dithered)' if member._dither else ''}\n"
                 f"    brightness: {member._brightness}\n"
-                f"    contrast: {member._contrast}\n") 
+                f"    contrast: {member._contrast}\n"
+                f"    tone: {member._tone}, gamma: {member._gamma}\n"
+                f"    memory: {self.session_manager._memory_info(member)}\n") 
         
+        session_manager = self.session_manager
+        print(f"Memory used: "
+              f"{session_manager._size_text(session_manager._memory_used())}"
+              f" of {session_manager._size_text(session_manager.memory_budget)}"
+              "\n")
         if hasattr(self.session_manager._current, "alias"):
             print("Current image: ", self.session_manager._current.alias, "\n")
         else:
@@ -563,6 +2216,7 @@ class ASCII_UserInterface:
     def _handle_quit_cmd(self):
         '''method to quit the program'''
         print("Ok bye!")
+        self.session_manager._end_session()
         self._run = False
         
     def _handle_render_cmd(self, user_input):
@@ -571,10 +2225,13 @@ class ASCII_UserInterface:
         method. If it is not valid the generic error message is printed'''
         
        if self._input_len == 1: # if the length is 1 then the input is simply "render"
-           self.session_manager._current.render()
+           self.session_manager._render_img()
             
        elif self._input_len == 2:
               self.session_manager._render_img(img = user_input[1])
+              
+       elif self._input_len == 3 and user_input[2] == "paged":
+            self.session_manager._render_img(img = user_input[1], pager = True)
          
        elif self._input_len ==4  and user_input[2] == "to":
             self.session_manager._render_img(img= user_input[1], 
@@ -609,18 +2266,39 @@ class ASCII_UserInterface:
         the number for width or height to between 10-5000. Since it would not 
         be much art with only a few pixels, or would risk crashing with a
         large number. Then it  pass the input along to the methods 
-        _set_img_dim or set_img_enhance'''
+        _set_img_dim or set_img_enhance (through _apply_set). tone takes 
+        off, levels or equalize instead of a number. "set memory num" sets 
+        the memory budget of the session instead.'''
         
-        if self._input_len !=4:
+        if self._input_len >= 2 and user_input[1] == "memory":
+            error = self._validate_set(user_input)
+            if error:
+                self._print_error(error + ".")
+            else:
+                self.session_manager._set_memory_budget(float(user_input[2]))
+        elif self._input_len >= 3 and user_input[2] in ["crop", "zoom", "mode",
+                                                        "dither"]:
+            self._handle_view_set(user_input)
+        elif self._input_len !=4:
             self._print_error(invalid_args = True)
-        elif user_input[2] not in ["width", "height","brightness", "contrast"]:
+        elif user_input[2] not in ["width", "height","brightness", "contrast",
+                                   "tone", "gamma"]:
             self._print_error("Valid attributes are 'width', 'height'"
-                              " 'brightness, 'contrast'.")
+                              " 'brightness, 'contrast', 'tone', 'gamma'.")
+        elif user_input[2] == "tone":
+            if user_input[3] in ASCII_art.tone_modes:
+                self._apply_set(user_input[1], "tone", user_input[3])
+            else:
+                self._print_error("Valid tones are " + 
+                                  ", ".join(ASCII_art.tone_modes) + ".")
         else:
             try: # incase the number cant be converted to float or int
                 img = user_input[1]
-                number = float(user_input[3])
                 option = user_input[2]
+                if option == "width" and user_input[3] == "fit":
+                    self._apply_set(img, option, "fit")
+                    return
+                number = float(user_input[3])
                 
                 if number <= 0:
                     self._print_error("Invalid number. Please enter a positive number.")
@@ -631,10 +2309,10 @@ class ASCII_UserInterface:
                     elif number > 5000:
                         self._print_error("Number too large. Maximuxm allowed number is 5000")
                     else:
-                      self.session_manager._set_img_dim(img, option, int(number))
+                      self._apply_set(img, option, int(number))
                     
-                elif option in ["brightness", "contrast"]:
-                    self.session_manager._set_img_enhance(img, option, number)
+                elif option in ["brightness", "contrast", "gamma"]:
+                    self._apply_set(img, option, number)
                     
             except ValueError:
                 print(user_input[3], "is not a valid number")
@@ -642,6 +2320,291 @@ class ASCII_UserInterface:
                 print(err_message)
                 
                         
+    def _handle_view_set(self, user_input):
+        '''method to handle "set img crop x y w h", "set img crop off", 
+        "set img zoom num", "set img mode name" and "set img dither on/off". 
+        These can't be used in begin/commit blocks or with several images 
+        since they decode the image again'''
+        
+        error = self._validate_set(user_input)
+        if error:
+            self._print_error(error + ".")
+        elif self._pending is not None or user_input[1] == "all" or any(
+                char in user_input[1] for char in "*?["):
+            self._print_error(f"{user_input[2].capitalize()} only works on "
+                              "one image at a time and not in a begin block.")
+        else:
+            try:
+                if user_input[2] in ["mode", "dither"]:
+                    self.session_manager._set_img_mode(
+                        user_input[1], 
+                        mode=user_input[3] if user_input[2] == "mode" else None,
+                        dither=user_input[3] == "on" 
+                        if user_input[2] == "dither" else None)
+                elif user_input[2] == "zoom":
+                    self.session_manager._set_img_crop(
+                        user_input[1], zoom=float(user_input[3]))
+                elif user_input[3] == "off":
+                    self.session_manager._set_img_crop(user_input[1])
+                else:
+                    self.session_manager._set_img_crop(
+                        user_input[1], box=[int(n) for n in user_input[3:]])
+            except (NameError, ValueError) as err_message:
+                print(err_message)
+    
+    def _apply_set(self, img, option, value):
+        '''Method to carry out a valid set command. Inside a begin/commit 
+        block the change is only saved until commit. If img is "all" or a 
+        glob pattern the change is made to every matching image with 
+        _set_imgs, otherwise to the single image as before.'''
+        
+        if self._pending is not None:
+            self._pending.append((img, option, value))
+        elif img == "all" or any(char in img for char in "*?[") or \
+            option in ["tone", "gamma"]:
+            self.session_manager._set_imgs([(img, option, value)])
+        elif option in ["width", "height"]:
+            self.session_manager._set_img_dim(img, option, value)
+        else:
+            self.session_manager._set_img_enhance(img, option, value)
+            
+    def _handle_begin_cmd(self):
+        '''Method to start a block of set commands that are applied together
+        when the user types commit'''
+        if self._pending is not None:
+            print("A block is already started. Use 'commit' to apply it or "
+                  "'rollback' to discard it")
+        else:
+            self._pending = []
+            print("Started a block. The set commands are applied at 'commit'")
+            
+    def _handle_commit_cmd(self):
+        '''Method to apply all set commands since begin in one go. If one of
+        the images can't be found, none of the changes are applied'''
+        if self._pending is None:
+            print("No block has been started. Use 'begin' to start one")
+            return
+        pending, self._pending = self._pending, None
+        try:
+            self.session_manager._set_imgs(pending)
+            print(f"Applied {len(pending)} changes")
+        except NameError as err_message:
+            print(err_message, "No changes were applied")
+            
+    def _handle_rollback_cmd(self):
+        '''Method to discard all set commands since begin'''
+        if self._pending is None:
+            print("No block has been started. Use 'begin' to start one")
+        else:
+            print(f"Discarded {len(self._pending)} changes")
+            self._pending = None
+     
+    def _validate_cmd(self, user_input):
+        '''Method to check that a command has a valid form without running 
+        it. Returns a description of what is wrong, or None if the command 
+        is valid. This is used to check a whole script before it is run, so
+        it follows the same rules as the handler methods.'''
+        
+        user_cmd, length = user_input[0], len(user_input)
+        if user_cmd not in self.command_handlers:
+            return f"'{user_cmd}' is not a valid command"
+        if user_cmd in self.no_argument_commands:
+            valid = length == 1
+        elif user_cmd == "load":
+            valid = (length == 3 and user_input[1] in ["image", "session"]) \
+                or (length == 5 and user_input[1] == "image" and 
+                    user_input[3] == "as")
+        elif user_cmd == "render":
+            valid = length in [1, 2] or (length == 3 and 
+                                         user_input[2] == "paged") or \
+                (length == 4 and user_input[2] == "to")
+        elif user_cmd == "save":
+            valid = length == 4 and user_input[1:3] == ["session", "as"]
+        elif user_cmd == "set":
+            return self._validate_set(user_input)
+        else: #run, scripts can't start other scripts
+            return "scripts can't run other scripts"
+        return None if valid else f"invalid form of the {user_cmd} command"
+    
+    def _validate_set(self, user_input):
+        '''Method to check the set command in the same way as _handle_set_cmd'''
+        if len(user_input) >= 2 and user_input[1] == "memory":
+            try:
+                if len(user_input) == 3 and float(user_input[2]) > 0:
+                    return None
+            except ValueError:
+                pass
+            return "memory takes the budget in MB as a positive number"
+        if len(user_input) >= 3 and user_input[2] == "crop":
+            if user_input[3:] == ["off"]:
+                return None
+            if len(user_input) != 7 or not all(
+                    number.isdigit() for number in user_input[3:]):
+                return "crop takes x y width height as whole numbers, or off"
+            if int(user_input[5]) == 0 or int(user_input[6]) == 0:
+                return "the crop width and height must be positive"
+            return None
+        if len(user_input) >= 3 and user_input[2] == "mode":
+            if len(user_input) == 4 and user_input[3] in ASCII_art.render_modes:
+                return None
+            return "valid modes are " + ", ".join(ASCII_art.render_modes)
+        if len(user_input) >= 3 and user_input[2] == "dither":
+            if len(user_input) == 4 and user_input[3] in ["on", "off"]:
+                return None
+            return "dither must be on or off"
+        if len(user_input) >= 3 and user_input[2] == "zoom":
+            try:
+                if len(user_input) == 4 and float(user_input[3]) >= 1:
+                    return None
+            except ValueError:
+                pass
+            return "zoom takes one number that is at least 1"
+        if len(user_input) != 4:
+            return "set takes 3 arguments"
+        option, value = user_input[2], user_input[3]
+        if option not in ["width", "height", "brightness", "contrast", "tone",
+                          "gamma"]:
+            return f"'{option}' is not a valid attribute"
+        if option == "width" and value == "fit":
+            return None
+        if option == "tone":
+            if value in ASCII_art.tone_modes:
+                return None
+            return "valid tones are " + ", ".join(ASCII_art.tone_modes)
+        try:
+            number = float(value)
+        except ValueError:
+            return f"{value} is not a valid number"
+        if number <= 0:
+            return "the number must be positive"
+        if option in ["width", "height"] and not 10 <= number <= 5000:
+            return "width and height must be between 10 and 5000"
+        return None
+    
+    def _read_script(self, filename):
+        '''Method to read and check a script with one studio command per 
+        line. Empty lines and lines starting with # are skipped. Returns a 
+        list of (line number, command split into words), or raises 
+        ValueError describing every invalid line if there are any.'''
+        
+        with open(filename, "r") as file:
+            lines = file.read().splitlines()
+        commands = []
+        errors = []
+        for line_number, line in enumerate(lines, start=1):
+            user_input = line.lower().split()
+            if not user_input or user_input[0].startswith("#"):
+                continue
+            error = self._validate_cmd(user_input)
+            if error:
+                errors.append(f"line {line_number}: {error}")
+            commands.append((line_number, user_input))
+        if errors:
+            raise ValueError(f"The script {filename} was not run since it "
+                             "has errors:\n" + "\n".join(errors))
+        return commands
+    
+    def _group_script(self, commands):
+        '''Method to group the commands of a script into the steps they are
+        run in. Renders to files that follow each other are independent of 
+        each other (as long as they write to different files), so they are 
+        put in the same step and run at the same time. Every other command 
+        is a step of its own.'''
+        
+        steps = []
+        for line_number, user_input in commands:
+            is_file_render = user_input[0] == "render" and len(user_input) == 4
+            if is_file_render and steps and steps[-1][0] == "renders" and \
+                self._out_name(user_input[3]) not in [
+                    self._out_name(cmd[3]) for _, cmd in steps[-1][1]]:
+                steps[-1][1].append((line_number, user_input))
+            elif is_file_render:
+                steps.append(("renders", [(line_number, user_input)]))
+            else:
+                steps.append(("command", [(line_number, user_input)]))
+        return steps
+    
+    @staticmethod
+    def _out_name(out):
+        '''Method to get the file that render writes for the name out, 
+        which gets .txt if it has no extension (see ASCII_art.render)'''
+        return os.path.abspath(out if "." in out else out + ".txt")
+    
+    def _run_renders(self, renders):
+        '''Method to run a group of renders to files at the same time. The 
+        images are looked up first and the last one becomes the current 
+        image, just as if the renders were run one after the other'''
+        
+        session_manager = self.session_manager
+        if not session_manager.members:
+            self._cmd = "render"
+            self._print_if_no_image("render")
+            return
+        jobs = []
+        for line_number, user_input in renders:
+            try:
+                jobs.append((session_manager._find_img(user_input[1]), 
+                             user_input[3]))
+            except NameError as err_message:
+                print(f"line {line_number}: {err_message}")
+                
+        def render(job):
+            try:
+                job[0].render(out=job[1])
+            except (ImportError, ValueError, OSError) as err_message:
+                print(err_message)
+                
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor() as executor:
+            list(executor.map(render, jobs))
+        if jobs and session_manager._current != jobs[-1][0]:
+            session_manager._current = jobs[-1][0]
+            session_manager._journal_change()
+            
+    def _run_script(self, filename):
+        '''Method to run all commands in a script, after checking that all
+        of them are valid. A summary of the time each kind of command took
+        is printed at the end'''
+        
+        commands = self._read_script(filename)
+        timings = {}
+        script_start = time.perf_counter()
+        for kind, step in self._group_script(commands):
+            if step[0][1] == ["quit"]:
+                #quit only ends the script, the session (and its journal)
+                #goes on
+                break
+            start = time.perf_counter()
+            if kind == "renders" and len(step) > 1:
+                self._run_renders(step)
+            else:
+                self._execute(step[0][1])
+            seconds = time.perf_counter() - start
+            name = "render to file" if kind == "renders" else step[0][1][0]
+            count, total = timings.get(name, (0, 0))
+            timings[name] = (count + len(step), total + seconds)
+        total_seconds = time.perf_counter() - script_start
+        
+        print(f"\n=== Script {filename}: {len(commands)} commands in "
+              f"{total_seconds * 1000:.1f} ms ===")
+        for name, (count, seconds) in sorted(timings.items(), 
+                                             key=lambda item: -item[1][1]):
+            print(f"    {name:<15} {count:>5} commands {seconds * 1000:10.1f} ms")
+        print()
+            
+    def _handle_run_cmd(self, user_input):
+        '''Method to handle the run command, which runs a script of 
+        commands'''
+        if self._input_len != 2:
+            self._print_error(invalid_args = True)
+            return
+        try:
+            self._run_script(user_input[1])
+        except FileNotFoundError:
+            print(f"The script '{user_input[1]}' was not found.")
+        except ValueError as err_message:
+            print(err_message)
+        
     def _print_if_no_image(self, user_cmd):
         '''method to print that no image has been loaded if user tries
         to use any method dependent on an image before loading an image'''
@@ -663,6 +2626,10 @@ class ASCII_UserInterface:
         self.render_help()
         self.set_help()
         self.save_load_session_help()
+        print("run filename: Run the commands in the script filename, one "
+              "command per line. The whole script is checked before it is "
+              "run, and renders to files that follow each other are run at "
+              "the same time.\n")
         print("quit: to exit the session")
                 
     #the following are just print functions for the different commands to be 
@@ -689,8 +2656,13 @@ class ASCII_UserInterface:
         print("render img: Like 'render,' but for the image saved with the "
               "name img. It can be the filename, its alias, or current.\n") 
         
+        print("render img paged: Same as above, but the art is shown in a "
+              "pager so that large art can be scrolled.\n")
+        
         print("render img to filename: Same as above, but the output is saved "
-              "to a file with the name as provided by filename.\n")
+              "to a file with the name as provided by filename. Filenames "
+              "ending with .gz or .zst are saved as compressed text, .pidx as "
+              "packed gscale indexes and .png as a picture of the text.\n")
         
     def set_help(self):
         print("set img width num: Set the width of the image img "
@@ -698,6 +2670,9 @@ class ASCII_UserInterface:
               "adjusted as explained in the render method." 
               "when rendering the image.\n")
         
+        print("set img width fit: Set the width of the image img so that it "
+              "fits in the console window.\n")
+        
         print("set img height num: Same as above, but for the image's height.\n")
         
         print("set img brightness num: Specify how the brightness of the image "
@@ -706,11 +2681,48 @@ class ASCII_UserInterface:
               "the image will be 20% darker.\n")
         print("set img contrast num: Same as above, but for contrast.\n")
         
+        print("set img tone name: Adjust the grey values of the image img "
+              "automatically. levels stretches them so the darkest part is "
+              "black and the lightest white, equalize spreads them so all "
+              "letters are used about as much, and off turns it off.\n")
+        
+        print("set img gamma num: Make the mid tones of the image img lighter"
+              " (num above 1) or darker (num below 1) without changing black"
+              " and white.\n")
+        
+        print("set img crop x y w h: Only render the part of the image img "
+              "that starts at pixel x, y and is w pixels wide and h pixels "
+              "high. Only that part of the image is decoded where the format "
+              "allows it. 'set img crop off' shows the whole image again.\n")
+        
+        print("set img zoom num: Crop the image img to the middle part that "
+              "is num times smaller than the whole image.\n")
+        
+        print("set img mode name: Change how the image img is rendered. "
+              "ascii uses one letter per pixel, halfblock uses half block "
+              "characters with 2 pixels per letter and braille uses braille "
+              "dots with 2x4 pixels per letter. 'set img dither on' shows grey"
+              " values in the last two modes with a dither pattern.\n")
+        
+        print("set memory num: Set how many MB the images of the session may"
+              " use. When they use more, the images that were used the "
+              "longest time ago are saved to disk (or decoded again) until "
+              "they are rendered or changed again.\n")
+        
+        print("set all attribute num: Same as above, but for every image. "
+              "Instead of all, a pattern such as img* can be used to change "
+              "every image whose filename or alias matches it.\n")
+        
+        print("begin: Start a block of set commands. They are not applied "
+              "until commit, and then all at once. rollback discards them.\n")
+        
     def save_load_session_help(self):    
         
         print("save session as filename: Save the loaded images with their "
               "filenames, size, brightness, and contrast. The pixel data of the" 
-              " images is not saved. The current image, current, is also saved.\n")
+              " images is not saved. The current image, current, is also saved. "
+              "After saving, every change is saved automatically in a journal "
+              "next to the file (filename.jsonl).\n")
         
         print("load session filename: Load the session saved in filename. The "
               "images whose filenames are saved are loaded, and the "
@@ -728,8 +2740,45 @@ class ASCII_UserInterface:
 
 
 
-def main():
-    ASCII_UserInterface()            
+def _parse_args(argv=None):
+    '''Function to parse the command line arguments. Without an image the 
+    interactive user interface is started, otherwise the image is rendered
+    once and the program exits'''
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="ASCII Art Studio: render images as ASCII art. Without "
+        "an image, the interactive studio is started.")
+    parser.add_argument("image", nargs="?", 
+                        help="image to render once instead of starting the "
+                        "studio")
+    parser.add_argument("--width", type=int, 
+                        help="width of the art in letters (default 50)")
+    parser.add_argument("--height", type=int, 
+                        help="height of the art in letters")
+    parser.add_argument("--out", 
+                        help="file to save the art to instead of printing it")
+    parser.add_argument("--script", 
+                        help="file with studio commands to run instead of "
+                        "starting the studio")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    if args.script:
+        user_interface = ASCII_UserInterface()
+        try:
+            user_interface._run_script(args.script)
+        except (OSError, ValueError) as err_message:
+            sys.exit(str(err_message))
+        finally:
+            user_interface.session_manager._close_journal()
+    elif args.image:
+        ascii_object = ASCII_art(args.image)
+        ascii_object.resize(new_height=args.height, new_width=args.width)
+        ascii_object.render(out=args.out or False)
+    else:
+        ASCII_UserInterface().run_program()
 
 if __name__ == "__main__":
     main()
@@ -5,11 +5,19 @@
 """
 
 import unittest
-from PIL import Image, ImageEnhance
+from PIL import Image, ImageEnhance, ImageFile
 import numpy as np
 import os
 import json
-from ASCII_Art_Studio import ASCII_art, SessionManager, ASCII_UserInterface
+import gc
+import gzip
+import io
+import struct
+import sys
+import time
+import weakref
+from ASCII_Art_Studio import ASCII_art, SessionManager, ASCII_UserInterface, \
+    MappedImage
 from unittest.mock import patch
 
 #Note: this requires that the user has an image with the name grayscale and slalom
@@ -61,6 +69,154 @@ class TestAscii_art(unittest.TestCase):
         self.assertEqual(ascii_object._target_width, expected_width,
                          f"target_width should be {expected_width}")
         
+    def test_area_average(self):
+        '''testing that the area downsampler gives the exact mean and variance
+        of each block, also when the blocks don't line up with the pixels'''
+        pixels = np.random.randint(0, 256, (120, 90))
+        mean, variance = ASCII_art._area_average(pixels, 30, 40)
+        blocks = pixels.reshape(40, 3, 30, 3)
+        self.assertTrue(np.allclose(mean, blocks.mean(axis=(1, 3))),
+                        "the mean of whole pixel blocks is wrong")
+        self.assertTrue(np.allclose(variance, blocks.var(axis=(1, 3))),
+                        "the variance of whole pixel blocks is wrong")
+        
+        #blocks of 120/7 x 90/11 pixels, each cell should be weighted equally
+        mean, variance = ASCII_art._area_average(pixels, 11, 7)
+        self.assertAlmostEqual(mean.mean(), pixels.mean(),
+                         msg = "partly covered pixels are not weighted right")
+        
+        ascii_object = ASCII_art("grayscale.jpg")
+        ascii_object.resize(new_width = 40)
+        self.assertIsNone(ascii_object._cell_variance, 
+                          "the cell variance should only be made on request")
+        ascii_object.resize(new_width = 40, variance = True)
+        self.assertEqual(ascii_object._cell_variance.shape, 
+                         (ascii_object._target_height, 40),
+                         "the cell variance was not kept after resizing")
+        self.assertEqual(ascii_object._cell_variance.dtype, np.float32,
+                         "the cell variance should be kept as float32")
+        ascii_object.image_enhance("contrast", 1.4)
+        self.assertIsNone(ascii_object._cell_variance, 
+                          "the cell variance of the old pixels was kept")
+        
+    def test_crop_and_zoom(self):
+        '''testing that cropping only keeps the region, that the target 
+        height follows the aspect ratio of the region and that zoom centers
+        the region'''
+        ascii_object = ASCII_art("grayscale.jpg")
+        ascii_object.crop(100, 50, 400, 300)
+        with Image.open("grayscale.jpg") as img:
+            expected = np.asarray(img.convert("L").crop((100, 50, 500, 350)))
+        self.assertTrue(np.array_equal(np.asarray(ascii_object._image), 
+                                       expected), 
+                        "the cropped pixels are not the region")
+        
+        ascii_object.resize(new_width = 40)
+        ascii_object.image_enhance("contrast", 1.5)
+        ascii_object.crop(0, 0, 800, 200)
+        self.assertEqual(ascii_object._image.size, (40, 5),
+                         "the height should follow the aspect of the region")
+        self.assertEqual(ascii_object._contrast, 1.5, 
+                         "the contrast was lost when cropping")
+        
+        ascii_object.zoom(4)
+        width, height = ascii_object._width, ascii_object._height
+        self.assertEqual(ascii_object._crop, 
+                         (width * 3 // 8, height * 3 // 8, 
+                          width * 5 // 8, height * 5 // 8),
+                         "zoom should crop the middle quarter")
+        ascii_object.crop()
+        self.assertIsNone(ascii_object._crop, "the crop was not removed")
+        with self.assertRaises(ValueError):
+            ascii_object.crop(width, 0, 10, 10)
+        
+    def test_decode_region(self):
+        '''testing that only the needed part of a tiled tiff, a tiff in one 
+        strip and a large jpeg is decoded for a crop, and that the pixels 
+        are the same as when decoding the whole image'''
+        pixels = (np.arange(256 * 256) * 7 % 251).astype(np.uint8).reshape(
+            256, 256)
+        #a tiled tiff with 64x64 tiles, which Pillow can't write itself
+        tiles = [pixels[y:y + 64, x:x + 64].tobytes() 
+                 for y in range(0, 256, 64) for x in range(0, 256, 64)]
+        tags = [(256, 3, 256), (257, 3, 256), (258, 3, 8), (259, 3, 1),
+                (262, 3, 1), (277, 3, 1), (322, 3, 64), (323, 3, 64),
+                (324, 4, [8 + index * 4096 for index in range(16)]),
+                (325, 4, [4096] * 16)]
+        data_end = 8 + 16 * 4096
+        arrays = b""
+        entries = b""
+        for tag, kind, value in tags:
+            if isinstance(value, list):
+                entries += struct.pack("<HHII", tag, kind, len(value), 
+                                       data_end + 2 + 12 * len(tags) + 4 + 
+                                       len(arrays))
+                arrays += struct.pack(f"<{len(value)}I", *value)
+            else:
+                entries += struct.pack("<HHIHH", tag, kind, 1, value, 0)
+        with open("test_tiles.tif", "wb") as file:
+            file.write(b"II*\x00" + struct.pack("<I", data_end) + 
+                       b"".join(tiles) + struct.pack("<H", len(tags)) + 
+                       entries + struct.pack("<I", 0) + arrays)
+        Image.fromarray(pixels).save("test_strip.tif")
+        #compressed, so Pillow decodes it whole with libtiff
+        Image.fromarray(pixels).save("test_lzw.tif", compression = "tiff_lzw")
+        
+        for filename in ["test_tiles.tif", "test_strip.tif", "test_lzw.tif"]:
+            ascii_object = ASCII_art(filename)
+            for box in [(70, 30, 130, 120), (0, 0, 256, 256)]:
+                with self.subTest(filename = filename, box = box):
+                    region = ascii_object._load_image(filename, box = box)
+                    self.assertTrue(np.array_equal(
+                        np.asarray(region), pixels[box[1]:box[3], 
+                                                   box[0]:box[2]]),
+                        "the region has the wrong pixels")
+        #the tiles that are left when the pixels are decoded
+        load = ImageFile.ImageFile.load
+        decoded = []
+        def spy(img):
+            decoded.append(list(img.tile))
+            return load(img)
+        with patch.object(ImageFile.ImageFile, "load", autospec = True,
+                          side_effect = spy):
+            ascii_object._load_image("test_tiles.tif", 
+                                     box = (70, 30, 130, 120))
+            ascii_object._load_image("test_strip.tif", 
+                                     box = (70, 30, 130, 120))
+        decoded = [tiles for tiles in decoded if tiles] #loaded ones are empty
+        self.assertEqual(len(decoded), 2, "the regions were decoded again")
+        self.assertEqual(len(decoded[0]), 4, 
+                         "only the 4 tiles of the region should be read")
+        self.assertEqual(decoded[-1][0].extents, (0, 0, 256, 90),
+                         "only the rows of the region should be read")
+        
+        #a region that is 10 times larger than needed is decoded at 1/8
+        ascii_object = ASCII_art("grayscale.jpg")
+        region = ascii_object._load_image("grayscale.jpg", 
+                                          box = (0, 0, 2000, 1500),
+                                          min_size = (200, 150))
+        self.assertEqual(region.size, (250, 188), 
+                         "the jpeg was not decoded at a smaller scale")
+        
+        #if the region can't be decoded by itself, the whole image is used
+        with patch.object(ASCII_art, "_decode_region", 
+                          side_effect = OSError("broken tile")):
+            region = ascii_object._load_image("test_tiles.tif", 
+                                              box = (70, 30, 130, 120))
+        self.assertTrue(np.array_equal(np.asarray(region), 
+                                       pixels[30:120, 70:130]),
+                        "the fallback has the wrong pixels")
+        #but errors that are not from the decoder are not hidden by it
+        with patch.object(ASCII_art, "_decode_region", 
+                          side_effect = TypeError("a bug")):
+            with self.assertRaises(TypeError):
+                ascii_object._load_image("test_tiles.tif", 
+                                         box = (70, 30, 130, 120))
+        with self.assertRaises(ValueError):
+            ascii_object._load_image("test_tiles.tif", box = (200, 0, 300, 10))
+        for filename in ["test_tiles.tif", "test_strip.tif", "test_lzw.tif"]:
+            os.remove(filename)
+        
     def test_enhance(self):
         '''asserting the enhance_method works'''
         img= "grayscale.jpg"
@@ -100,26 +256,245 @@ class TestAscii_art(unittest.TestCase):
         f"the simulated values were expected to only be withing the range "
         f"0:{gscale_len} but were found outside that range")
         
-    @patch("builtins.print")  # Patch the print function
-    def test_render_print(self, mock_print):
-        '''testing that the render function can print to console. However, this 
-        does not check the actual characters printed in some meaningsful way'''
+    def test_render_print(self):
+        '''testing that the render function can print to console. The art is
+        written in chunks to the binary buffer of sys.stdout, so a text 
+        wrapper around a BytesIO is used in place of the console'''
         img = "grayscale.jpg"
         ascii_object = ASCII_art(img)
         ascii_object.resize()
+        ascii_object._console_chunk_size = 100 #more than one chunk
         
-        # Call the render function
-        ascii_object.render()
-        
-        # Check if the print function was called
-        self.assertTrue(mock_print.called, "print function was not called")
+        console = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+        with patch("sys.stdout", console):
+            ascii_object.render()
+        printed_content = console.buffer.getvalue().decode()
         
         # Check if the printed content is not empty
-        printed_content = "\n".join(call_args[0][0] for call_args in mock_print.call_args_list)
         self.assertTrue(printed_content.strip(), "printed content is empty")
+        self.assertEqual(len(printed_content.splitlines()), 
+                         ascii_object._target_height, 
+                         "the number of printed rows is not target height")
+        
+        #consoles without a binary buffer get the text instead
+        console = io.StringIO()
+        with patch("sys.stdout", console):
+            ascii_object.render()
+        self.assertEqual(console.getvalue(), printed_content, 
+                         "the text and binary console output are different")
+        
+    def test_resize_fit(self):
+        '''testing that width fit uses the width of the console'''
+        ascii_object = ASCII_art("grayscale.jpg")
+        with patch("shutil.get_terminal_size", 
+                   return_value=os.terminal_size((120, 40))):
+            ascii_object.resize(new_width = "fit")
+        self.assertEqual(ascii_object._target_width, 119,
+                         "the width should be one less than the console")
         
 #note: i asked chatgpt for help on this on how to assert that print has been used
 
+    def test_load_mapped_formats(self):
+        '''testing that PGM, .npy and raw files are memory mapped and give the
+        same grey values as when the image is decoded by Pillow'''
+        pixels = np.asarray(Image.open("grayscale.jpg").convert("L"))
+        height, width = pixels.shape
+        Image.fromarray(pixels).save("test_mapped.pgm")
+        np.save("test_mapped.npy", pixels)
+        pixels.tofile("test_mapped.raw")
+        
+        mapped_objects = [ASCII_art("test_mapped.pgm"), 
+                          ASCII_art("test_mapped.npy"),
+                          ASCII_art("test_mapped.raw", raw_size=(width, height))]
+        with patch.object(ASCII_art, "_file_digest") as file_digest:
+            for ascii_object in mapped_objects:
+                self.assertIsInstance(ascii_object._image, MappedImage,
+                                      "the image was not memory mapped")
+                self.assertEqual((ascii_object._width, ascii_object._height),
+                                 (width, height), "the mapped size is wrong")
+                self.assertTrue(np.array_equal(np.asarray(
+                    ascii_object._image), pixels),
+                    "the mapped pixels are not the same as the image")
+                ascii_object.resize(new_width = 40)
+                self.assertEqual(ascii_object._image.size, 
+                                 (40, ascii_object._target_height),
+                                 "resizing a mapped image gave the wrong size")
+        self.assertFalse(file_digest.called, 
+                         "a mapped file should not be hashed")
+        
+        #large frames of the same size that only differ in a few rows must 
+        #not share pixels
+        frame = np.full((3000, 2000), 200, dtype=np.uint8)
+        np.save("test_mapped_frame1.npy", frame)
+        frame[1494:1506] = 0
+        np.save("test_mapped_frame2.npy", frame)
+        frames = [ASCII_art("test_mapped_frame1.npy"), 
+                  ASCII_art("test_mapped_frame2.npy")]
+        self.assertIsNot(frames[0]._image, frames[1]._image,
+                         "different frames shared the same image")
+        self.assertEqual(np.asarray(frames[1]._image).min(), 0,
+                         "the second frame got the pixels of the first")
+        del mapped_objects, frames, ascii_object #closing the memory maps
+        for number in [1, 2]:
+            os.remove(f"test_mapped_frame{number}.npy")
+        
+        with self.assertRaises(ValueError):
+            ASCII_art("test_mapped.raw") #raw files need a size
+        #float pixels could be 0-1 or 0-255, so they are not guessed
+        np.save("test_mapped.npy", pixels.astype(np.float32))
+        with self.assertRaises(ValueError):
+            ASCII_art("test_mapped.npy")
+        with self.assertRaises(ValueError):
+            ASCII_art("test_mapped.raw", raw_size=(width, height), 
+                      raw_dtype="float32")
+        for extension in ["pgm", "npy", "raw"]:
+            os.remove("test_mapped." + extension)
+
+    def test_render_tiles(self):
+        '''testing that rendering on several threads gives exactly the same
+        file as rendering on one thread, and that the rows are written in the 
+        right order'''
+        ascii_object = ASCII_art("slalom.jpg")
+        ascii_object.resize(new_width = 600)
+        ascii_object._min_parallel_pixels = 0 #forcing tiles for a small image
+        
+        ascii_object.render(out = "test_render_single.txt", workers = 1)
+        ascii_object.render(out = "test_render_tiles.txt", workers = 4)
+        with open("test_render_single.txt") as single, \
+            open("test_render_tiles.txt") as tiles:
+            single_rows = single.read().splitlines()
+            tiles_rows = tiles.read().splitlines()
+        os.remove("test_render_single.txt")
+        os.remove("test_render_tiles.txt")
+        
+        self.assertEqual(len(tiles_rows), ascii_object._target_height,
+                         "the number of rows is not the same as target height")
+        self.assertEqual(single_rows, tiles_rows, 
+                         "rendering with tiles changed the output")
+        
+        #streaming yields the same art in several small tiles, in order
+        ascii_object.set_mode("braille")
+        ascii_object.resize(new_width = 300)
+        chunks = list(ascii_object._stream_tiles(workers = 4, 
+                                                 tile_pixels = 5000))
+        self.assertGreater(len(chunks), 4, "the art was not streamed in tiles")
+        self.assertEqual(b"".join(chunks), 
+                         b"".join(ascii_object._encoded_tiles(workers = 1)),
+                         "streaming the tiles changed the output")
+
+
+    def test_render_encoders(self):
+        '''testing that the compressed and packed outputs contain the same 
+        art as the plain text file, and that the png has one cell per letter'''
+        ascii_object = ASCII_art("slalom.jpg")
+        ascii_object.resize(new_width = 77)
+        ascii_object.render(out = "test_encoders")
+        with open("test_encoders.txt") as file:
+            text = file.read()
+            
+        ascii_object.render(out = "test_encoders.gz")
+        with gzip.open("test_encoders.gz", "rt") as file:
+            self.assertEqual(file.read(), text, "the gzip file is different")
+            
+        ascii_object.render(out = "test_encoders.pidx")
+        self.assertEqual(ASCII_art.read_packed("test_encoders.pidx") + "\n",
+                         text, "the packed file is different")
+        self.assertLess(os.path.getsize("test_encoders.pidx"), len(text),
+                        "the packed file is not smaller than the text")
+        
+        ascii_object.render(out = "test_encoders.png")
+        atlas = ascii_object._glyph_atlas()
+        with Image.open("test_encoders.png") as picture:
+            self.assertEqual(picture.size, (77 * atlas.shape[2], 
+                             ascii_object._target_height * atlas.shape[1]),
+                             "the png does not have one cell per letter")
+        
+        for extension in ["txt", "gz", "pidx", "png"]:
+            os.remove("test_encoders." + extension)
+
+    def test_tone(self):
+        '''testing that auto levels, equalize and gamma change the grey 
+        values as they should, and that the histogram is cached'''
+        rows, cols = np.mgrid[0:60, 0:80]
+        np.save("test_tone.npy", (100 + (rows + cols) // 4).astype(np.uint8))
+        ascii_object = ASCII_art("test_tone.npy")
+        ascii_object.resize(new_width = 80, new_height = 60)
+        self.assertIsNone(ascii_object._tone_lut(), 
+                          "without a tone the render should not change")
+        
+        histogram = ascii_object._histogram()
+        self.assertIs(ascii_object._histogram(), histogram,
+                      "the histogram was not cached")
+        self.assertEqual(histogram.sum(), 80 * 60, "the histogram is wrong")
+        
+        ascii_object.set_tone("levels")
+        pixels = np.asarray(ascii_object._image)
+        levels = ascii_object._tone_lut()[pixels]
+        self.assertEqual((levels.min(), levels.max()), (0, 255),
+                         "levels should stretch the grey values to 0-255")
+        indexes = ascii_object._index_lut()[pixels]
+        self.assertEqual((indexes.min(), indexes.max()), 
+                         (0, len(ascii_object.gscale) - 1),
+                         "levels should use the whole gscale")
+        
+        ascii_object.set_tone("equalize")
+        counts = np.bincount(ascii_object._tone_lut()[pixels].ravel() // 64)
+        self.assertLess(counts.max() / counts.min(), 1.5,
+                        "equalize should use every part of the grey scale")
+        
+        ascii_object.set_tone("off", gamma = 2)
+        lut = ascii_object._tone_lut()
+        self.assertEqual((lut[0], lut[255]), (0, 255), 
+                         "gamma should not change black and white")
+        self.assertGreater(lut[128], 128, "gamma 2 should lighten mid tones")
+        
+        old_image = weakref.ref(ascii_object._image)
+        ascii_object.resize(new_width = 40)
+        self.assertIsNone(old_image(), 
+                          "the histogram cache kept the old image in memory")
+        self.assertIsNot(ascii_object._histogram(), histogram,
+                         "the histogram should follow the resized image")
+        with self.assertRaises(NameError):
+            ascii_object.set_tone("auto")
+        os.remove("test_tone.npy")
+
+    def test_render_modes(self):
+        '''testing that half block and braille letters have the right dots,
+        and that the image is resized to letters times the pixels per letter'''
+        pixels = np.full((8, 4), 255, dtype = np.uint8)
+        pixels[0, 0] = pixels[3, 1] = 0 #dots 1 and 8 of the first letter
+        pixels[4:, 2:] = 0              #every dot of the last letter
+        np.save("test_modes.npy", pixels)
+        ascii_object = ASCII_art("test_modes.npy")
+        
+        ascii_object.set_mode("braille")
+        ascii_object.resize(new_height = 2, new_width = 2)
+        self.assertEqual(ascii_object._image.size, (4, 8),
+                         "the image is not 2x4 pixels per letter")
+        ascii_object.render(out = "test_modes.txt")
+        with open("test_modes.txt", encoding = "utf-8") as file:
+            self.assertEqual(file.read().splitlines(), 
+                             ["\u2881\u2800", "\u2800\u28ff"],
+                             "the braille dots are wrong")
+        
+        ascii_object = ASCII_art("test_modes.npy")
+        ascii_object.set_mode("halfblock")
+        ascii_object.resize(new_height = 4, new_width = 4)
+        ascii_object.render(out = "test_modes.txt")
+        with open("test_modes.txt", encoding = "utf-8") as file:
+            rows = file.read().splitlines()
+        self.assertEqual(rows[0], "\u2580   ", "the half blocks are wrong")
+        self.assertEqual(rows[1], " \u2584  ", "the half blocks are wrong")
+        self.assertEqual(rows[2:], ["  \u2588\u2588"] * 2, 
+                         "the half blocks are wrong")
+        
+        with self.assertRaises(ValueError):
+            ascii_object.render(out = "test_modes.png")
+        with self.assertRaises(NameError):
+            ascii_object.set_mode("sixel")
+        os.remove("test_modes.txt")
+        os.remove("test_modes.npy")
+        
 
 class TestSessionManager(unittest.TestCase):
 #note: the first two methods here are just to help structure the code and
@@ -176,6 +551,46 @@ class TestSessionManager(unittest.TestCase):
                         "contrast should be set to 13")
        #saving
        
+   def test_set_many(self):
+       '''testing that changes to all images or a glob pattern are applied
+       to every matching image, and that nothing is changed if one of the 
+       names in a batch is invalid'''
+       self._load_images()
+       grayscale_obj = self.session_manager.members[0]
+       slalom_obj = self.session_manager.members[1]
+       
+       self.session_manager._set_imgs([("all", "width", 60), 
+                                       ("gray*", "contrast", 1.4)])
+       self.assertEqual(grayscale_obj._target_width, 60, 
+                        "width was not set for all images")
+       self.assertEqual(slalom_obj._target_width, 60, 
+                        "width was not set for all images")
+       self.assertEqual(grayscale_obj._contrast, 1.4, 
+                        "contrast was not set for the matching image")
+       self.assertEqual(slalom_obj._contrast, 1, 
+                        "contrast was set for an image that did not match")
+       
+       with self.assertRaises(NameError):
+           self.session_manager._set_imgs([("skidor", "brightness", 0.5),
+                                           ("missing", "width", 20)])
+       self.assertEqual(slalom_obj._brightness, 1, 
+                        "a batch with an invalid name was partly applied")
+       
+   def test_apply_settings(self):
+       '''testing that applying brightness and contrast together gives the
+       same pixels as enhancing them one at a time'''
+       self._load_images()
+       one_at_a_time = self.session_manager.members[1]
+       one_at_a_time.image_enhance("brightness", 1.3)
+       one_at_a_time.image_enhance("contrast", 0.6)
+       
+       together = ASCII_art("slalom.jpg")
+       together.resize(new_width = 50)
+       together.apply_settings(brightness = 1.3, contrast = 0.6)
+       self.assertTrue(np.array_equal(np.asarray(one_at_a_time._image), 
+                                      np.asarray(together._image)),
+                       "apply_settings gave different pixels than image_enhance")
+       
    def compare_attributes(self, obj1, obj2):
        '''Helper function to compare attributes for two sessions by checking that
        the attributes are the same'''
@@ -230,6 +645,226 @@ class TestSessionManager(unittest.TestCase):
                         self.new_session_manager._current.alias,
                      "The current image for the two sessions are not the same")
        
+   def test_shared_content(self):
+       '''testing that images with the same content share their decoded and
+       resized image even with other names, and that images with the same 
+       file name in different folders are kept apart in saved sessions'''
+       os.makedirs("test_shared", exist_ok = True)
+       with open("slalom.jpg", "rb") as source:
+           content = source.read()
+       with open("test_shared_copy.jpg", "wb") as copy:
+           copy.write(content)
+       with open("grayscale.jpg", "rb") as source, \
+           open(os.path.join("test_shared", "slalom.jpg"), "wb") as copy:
+           copy.write(source.read())
+       #images of earlier tests that are only kept by reference cycles would
+       #still be in the store, so they are collected first
+       gc.collect()
+       
+       with patch.object(ASCII_art, "_load_image", autospec = True,
+                         side_effect = ASCII_art._load_image) as decode:
+           self.session_manager._load_image("slalom.jpg")
+           self.session_manager._load_image("test_shared_copy.jpg")
+           first, second = self.session_manager.members
+           self.assertIs(first._image, second._image,
+                         "the same content should share the resized image")
+           self.assertEqual(decode.call_count, 1, 
+                            "the same content was decoded more than once")
+           self.session_manager._set_imgs([("all", "width", 120)])
+           self.assertIs(first._image, second._image,
+                         "a second resize should be shared as well")
+           first.release()
+           self.assertIs(first._image, second._image,
+                         "a released image should come back from the store")
+           self.assertEqual(decode.call_count, 1, 
+                            "the same content was decoded more than once")
+       
+       self.session_manager._load_image(
+           os.path.join("test_shared", "slalom.jpg"), alias = "other")
+       other = self.session_manager.members[2]
+       self.assertNotEqual(other._digest, first._digest,
+                           "different content got the same digest")
+       self.session_manager._save_session("test_session")
+       new_session_manager = SessionManager()
+       new_session_manager._load_session("test_session")
+       self.assertEqual([member._digest for member in 
+                         new_session_manager.members],
+                        [first._digest, first._digest, other._digest],
+                        "the session loaded the wrong files")
+       
+       new_session_manager._close_journal()
+       self.session_manager._close_journal()
+       for filename in ["test_shared_copy.jpg", "test_session.json", 
+                        "test_session.jsonl", 
+                        os.path.join("test_shared", "slalom.jpg")]:
+           if os.path.exists(filename):
+               os.remove(filename)
+       os.rmdir("test_shared")
+       
+   def test_memory_budget(self):
+       '''testing that the least recently used images are released when the
+       session is over its memory budget, and that they render the same 
+       when they are loaded again'''
+       def rendered(member):
+           member.render(out = "test_memory.txt")
+           with open("test_memory.txt") as file:
+               return file.read()
+       
+       self.session_manager = SessionManager(memory_budget = 16_000)
+       self.session_manager._load_image("grayscale.jpg")
+       self.session_manager._set_img_dim("grayscale.jpg", "width", 120)
+       self.session_manager._set_img_enhance("grayscale.jpg", "contrast", 1.4)
+       grayscale_obj = self.session_manager.members[0]
+       before = rendered(grayscale_obj)
+       
+       self.session_manager._load_image("slalom.jpg")
+       self.session_manager._set_img_dim("slalom.jpg", "width", 200)
+       self.assertTrue(grayscale_obj._spill_file, 
+                       "the oldest image should be spilled to disk")
+       self.assertLessEqual(self.session_manager._memory_used(), 16_000,
+                            "the session is over its memory budget")
+       self.assertEqual(rendered(grayscale_obj), before,
+                        "the spilled image renders differently")
+       self.assertIsNone(grayscale_obj._spill_file, 
+                         "the spill file should be removed when loaded")
+       
+       #images that are only resized are taken from the store again
+       self.session_manager._load_image("slalom.jpg", alias = "copy1")
+       self.session_manager._load_image("slalom.jpg", alias = "copy2")
+       self.session_manager._set_imgs([("copy*", "width", 200)])
+       shared_objs = self.session_manager.members[2:]
+       for member in shared_objs:
+           member.release(self.session_manager._spill_folder)
+           self.assertIsNone(member._spill_file, 
+                             "a resized image should not be spilled")
+       self.assertIs(shared_objs[0]._image, shared_objs[1]._image,
+                     "released images should still be shared")
+       
+       #without a spill folder, only the edits are kept
+       slalom_obj = ASCII_art("slalom.jpg")
+       slalom_obj.apply_settings(width = 200, brightness = 0.8)
+       before = rendered(slalom_obj)
+       slalom_obj.release()
+       self.assertEqual(slalom_obj._held_images(), [], 
+                        "the pixels were not released")
+       self.assertEqual(rendered(slalom_obj), before,
+                        "the rebuilt image renders differently")
+       slalom_obj.resize(new_width = 50)
+       slalom_obj.image_enhance("contrast", 1.4)
+       slalom_obj.resize(new_width = 120)
+       before = np.asarray(slalom_obj._image)
+       slalom_obj.release()
+       self.assertTrue(np.array_equal(np.asarray(slalom_obj._image), before),
+                       "the edits did not give the same pixels again")
+       os.remove("test_memory.txt")
+       
+   def test_session_journal(self):
+       '''testing that changes made after saving are kept in the journal and
+       replayed when the session is loaded, also after the journal has been
+       compacted into the session file and when the last line is broken'''
+       self._load_images()
+       self.session_manager._save_session("test_journal")
+       self.session_manager._set_img_dim("grayscale.jpg", "width", 70)
+       self.session_manager._load_image("slalom.jpg", alias = "third")
+       
+       new_session_manager = SessionManager()
+       new_session_manager._load_session("test_journal")
+       new_session_manager._close_journal()
+       self.assertEqual(len(new_session_manager.members), 3,
+                        "the image loaded after saving is missing")
+       self.assertEqual(new_session_manager.members[0]._target_width, 70,
+                        "the width set after saving is missing")
+       self.assertEqual(new_session_manager._current.alias, "third",
+                        "the current image was not replayed")
+       
+       #a crash in the middle of writing a line
+       with open("test_journal.jsonl", "a") as journal:
+           journal.write('{"index": 0, "mem')
+       new_session_manager._load_session("test_journal")
+       new_session_manager._set_img_dim("skidor", "width", 30)
+       new_session_manager._close_journal()
+       new_session_manager._load_session("test_journal")
+       new_session_manager._close_journal()
+       self.assertEqual(new_session_manager.members[1]._target_width, 30,
+                        "a change after a broken line was lost")
+       
+       self.session_manager._journal_compact_every = 3
+       self.session_manager._set_img_enhance("skidor", "contrast", 0.5)
+       with open("test_journal.jsonl") as journal:
+           self.assertEqual(journal.read(), "", 
+                            "the journal was not compacted")
+       self.session_manager._close_journal()
+       
+       new_session_manager._load_session("test_journal")
+       new_session_manager._close_journal()
+       self.assertEqual(new_session_manager.members[1]._contrast, 0.5,
+                        "the compacted session is missing a change")
+       
+       #the last change before a pause is synced by the timer
+       new_session_manager._load_session("test_journal")
+       new_session_manager._journal_sync_seconds = 0.2
+       new_session_manager._set_img_dim("skidor", "width", 40)
+       self.assertEqual(new_session_manager._unsynced_records, 1,
+                        "the change should not be synced right away")
+       time.sleep(0.6)
+       self.assertEqual(new_session_manager._unsynced_records, 0,
+                        "the change was not synced by the timer")
+       new_session_manager._close_journal()
+       os.remove("test_journal.json")
+       os.remove("test_journal.jsonl")
+
+   @patch("builtins.print")
+   def test_journal_on_change(self, mock_print):
+       '''testing that loading a session does not open its journal until a
+       change is made, that a journal that can't be opened does not stop the
+       changes, and that a session that was never saved can be recovered'''
+       self._load_images()
+       self.session_manager._save_session("test_journal")
+       self.session_manager._close_journal()
+       os.remove("test_journal.jsonl")
+
+       new_session_manager = SessionManager()
+       new_session_manager._load_session("test_journal")
+       self.assertFalse(os.path.exists("test_journal.jsonl"),
+                        "loading a session should not write its journal")
+       new_session_manager._set_img_dim("skidor", "width", 30)
+       self.assertTrue(os.path.exists("test_journal.jsonl"),
+                       "the journal was not opened by the change")
+       new_session_manager._close_journal()
+
+       new_session_manager = SessionManager()
+       new_session_manager._load_session("test_journal")
+       with patch.object(SessionManager, "_open_journal",
+                         side_effect = PermissionError("no access")):
+           new_session_manager._set_img_dim("skidor", "width", 40)
+           new_session_manager._set_img_dim("skidor", "width", 45)
+       self.assertEqual(new_session_manager.members[1]._target_width, 45,
+                        "the change was lost when the journal failed")
+       self.assertEqual(sum("no access" in str(call) for call in
+                            mock_print.call_args_list), 1,
+                        "the journal error should be printed once")
+       new_session_manager._save_session("test_journal")
+       new_session_manager._close_journal()
+       new_session_manager._load_session("test_journal")
+       self.assertEqual(new_session_manager.members[1]._target_width, 45,
+                        "saving after a journal error did not save it all")
+       new_session_manager._close_journal()
+
+       #a session that is never saved, and a crash
+       unsaved_session_manager = SessionManager()
+       unsaved_session_manager.recovery_file = "test_recovery.json"
+       unsaved_session_manager._load_image("grayscale.jpg")
+       unsaved_session_manager._set_img_dim("grayscale.jpg", "width", 33)
+       new_session_manager._load_session("test_recovery")
+       new_session_manager._close_journal()
+       self.assertEqual(new_session_manager.members[0]._target_width, 33,
+                        "the unsaved session was not recovered")
+       unsaved_session_manager._end_session()
+       self.assertFalse(os.path.exists("test_recovery.jsonl"),
+                        "the recovery session was kept after quitting")
+       for filename in ["test_journal.json", "test_journal.jsonl"]:
+           os.remove(filename)
+
    def test_current_change(self):
        '''test that the current image changes everytime an user uses a method 
        to adjust the image attributes'''
@@ -257,6 +892,333 @@ class TestSessionManager(unittest.TestCase):
        
 
 
-if __name__ == '__main__':
-    unittest.main()       
+class TestUserInterface(unittest.TestCase):
+    
+   @patch("builtins.input", side_effect=AssertionError("input was called"))
+   def test_no_start_on_init(self, mock_input):
+       '''testing that creating the user interface does not start the command
+       prompt, so that it can be used from other programs'''
+       user_interface = ASCII_UserInterface()
+       self.assertFalse(mock_input.called, "the command prompt was started")
+       self.assertEqual(user_interface.session_manager.members, [],
+                        "the new session should not have any images")
+
+   @patch.object(ASCII_art, "render")
+   def test_render_current(self, mock_render):
+       '''testing that rendering the current image with just render marks
+       it as the most recently used, like rendering it by name does'''
+       user_interface = ASCII_UserInterface()
+       session_manager = user_interface.session_manager
+       session_manager._load_image("grayscale.jpg")
+       session_manager._load_image("slalom.jpg")
+       session_manager._current = session_manager.members[0]
+       user_interface._execute(["render"])
+       self.assertTrue(mock_render.called, "the image was not rendered")
+       self.assertEqual(max(session_manager._last_used, 
+                            key = session_manager._last_used.get),
+                        session_manager.members[0],
+                        "render did not mark the current image as used")
+       
+   @patch("builtins.print")
+   def test_memory_without_images(self, mock_print):
+       '''testing that the memory budget can be set before any image is
+       loaded, while info memory still needs an image'''
+       user_interface = ASCII_UserInterface()
+       user_interface._execute(["set", "memory", "64"])
+       self.assertEqual(user_interface.session_manager.memory_budget,
+                        64 * 2**20, "the memory budget was not set")
+       mock_print.reset_mock()
+       user_interface._execute(["info", "memory"])
+       self.assertIn("No images loaded", str(mock_print.call_args),
+                     "info memory without images should print an error")
+
+       
+   @patch("builtins.print")
+   def test_run_script(self, mock_print):
+       '''testing that a script is checked before it is run, and that the 
+       renders to files in it are grouped and all written'''
+       user_interface = ASCII_UserInterface()
+       with open("test_script.txt", "w") as script:
+           script.write("load image grayscale.jpg\n"
+                        "set all width 5\n" #too small for a script
+                        "render grayscale.jpg to test_script_art\n")
+       with self.assertRaises(ValueError):
+           user_interface._run_script("test_script.txt")
+       self.assertEqual(user_interface.session_manager.members, [],
+                        "a script with errors should not be run")
+       
+       with open("test_script.txt", "w") as script:
+           script.write("# comment\n"
+                        "load image grayscale.jpg as gray\n"
+                        "load image slalom.jpg\n"
+                        "set all width 30\n"
+                        "render gray to test_script_1\n"
+                        "render slalom.jpg to test_script_2.gz\n")
+       steps = user_interface._group_script(
+           user_interface._read_script("test_script.txt"))
+       self.assertEqual([len(step) for kind, step in steps], [1, 1, 1, 2],
+                        "the two renders should be in the same step")
+       
+       user_interface._run_script("test_script.txt")
+       self.assertTrue(os.path.exists("test_script_1.txt"), 
+                       "the first render was not written")
+       self.assertTrue(os.path.exists("test_script_2.gz"), 
+                       "the second render was not written")
+       self.assertEqual(user_interface.session_manager._current._file_name,
+                        "slalom.jpg", "the last render should be current")
+       
+       #renders to the same file are not run at the same time
+       steps = user_interface._group_script(
+           [(1, ["render", "gray", "to", "test_script_1"]),
+            (2, ["render", "slalom.jpg", "to", "test_script_1.txt"])])
+       self.assertEqual(len(steps), 2, 
+                        "renders to the same file were put in one step")
+       
+       #quit only ends the script, and the journal is kept open
+       user_interface.session_manager._save_session("test_session")
+       with open("test_script.txt", "w") as script:
+           script.write("set all width 40\nquit\nset all width 50\n")
+       user_interface._run_script("test_script.txt")
+       self.assertEqual(user_interface.session_manager.members[0]
+                        ._target_width, 40, "the script should end at quit")
+       self.assertIsNotNone(user_interface.session_manager._journal,
+                            "quit in a script closed the journal")
+       user_interface.session_manager._close_journal()
+       for filename in ["test_script.txt", "test_script_1.txt", 
+                        "test_script_2.gz", "test_session.json", 
+                        "test_session.jsonl"]:
+           os.remove(filename)
+
+
+#the golden renders are kept in this folder. If the output is changed on 
+#purpose, they are written again with: python assertion.py --update-golden
+GOLDEN_FOLDER = "golden"
+
+#every golden render: name -> (image, width, mode, dither, settings), where
+#settings are passed on to apply_settings. The gradient images are made by
+#synthetic_image
+GOLDEN_CASES = {
+    "gradient_h": ("gradient_h", 64, "ascii", False, {}),
+    "gradient_v": ("gradient_v", 24, "ascii", False, {}),
+    "gradient_d_braille": ("gradient_d", 32, "braille", True, {}),
+    "gradient_d_halfblock": ("gradient_d", 32, "halfblock", True, {}),
+    "grayscale": ("grayscale.jpg", 60, "ascii", False, {}),
+    "grayscale_enhanced": ("grayscale.jpg", 60, "ascii", False, 
+                           {"brightness": 1.3, "contrast": 0.7}),
+    "grayscale_levels": ("grayscale.jpg", 60, "ascii", False, 
+                         {"tone": "levels", "gamma": 0.8}),
+    "slalom": ("slalom.jpg", 80, "ascii", False, {}),
+    "slalom_equalize": ("slalom.jpg", 80, "ascii", False, 
+                        {"tone": "equalize"}),
+    "slalom_braille": ("slalom.jpg", 40, "braille", False, {}),
+    "slalom_halfblock": ("slalom.jpg", 40, "halfblock", True, 
+                         {"brightness": 0.8, "contrast": 1.5}),
+}
 
+
+def synthetic_image(name):
+    '''returns the filename of a png with a gradient, which is written if it
+    doesn't exist. The pngs are lossless so the pixels are the same 
+    everywhere, unlike the jpgs which can decode slightly differently with
+    other versions of Pillow'''
+    filename = f"test_golden_{name}.png"
+    if not os.path.exists(filename):
+        rows, cols = np.mgrid[0:96, 0:256]
+        pixels = {"gradient_h": cols, 
+                  "gradient_v": rows * 255 // 95, 
+                  "gradient_d": (rows * 255 // 95 + cols) // 2}[name]
+        Image.fromarray(pixels.astype(np.uint8)).save(filename)
+    return filename
+
+
+def golden_render(case):
+    '''returns the ASCII_art object of a golden case and its rendered rows'''
+    image, width, mode, dither, settings = GOLDEN_CASES[case]
+    if not image.endswith(".jpg"):
+        image = synthetic_image(image)
+    ascii_object = ASCII_art(image)
+    ascii_object.set_mode(mode, dither)
+    ascii_object.apply_settings(width = width, **settings)
+    ascii_object.render(out = "test_golden.txt")
+    with open("test_golden.txt", encoding = "utf-8") as file:
+        rows = file.read().splitlines()
+    os.remove("test_golden.txt")
+    return ascii_object, rows
+
+
+def reference_render(ascii_object):
+    '''renders the image of ascii_object one cell at a time the way it was 
+    first written (np.vectorize over the gscale indexes for ascii, and the 
+    unicode dot numbers for braille), to check the optimized render against.
+    The tone mapping is applied to the pixels first'''
+    pixels = np.asarray(ascii_object._image).astype(int)
+    tone = ascii_object._tone_lut()
+    if tone is not None:
+        pixels = tone[pixels].astype(int)
+    if ascii_object._mode == "ascii":
+        indexes = np.rint(ascii_object._ASCII_art__normalize(pixels)).astype(int)
+        letters = np.vectorize(lambda index: ascii_object.gscale[index])(indexes)
+        return ["".join(row) for row in letters]
+    
+    if ascii_object._dither:
+        bayer = np.array(ascii_object._bayer)
+        thresholds = (bayer[np.arange(pixels.shape[0]) % 4][
+            :, np.arange(pixels.shape[1]) % 4] + 0.5) * 16
+    else:
+        thresholds = np.full(pixels.shape, 128)
+    dots = pixels < thresholds
+    if ascii_object._mode == "halfblock":
+        halves = {(False, False): " ", (False, True): "\u2584", 
+                  (True, False): "\u2580", (True, True): "\u2588"}
+        return ["".join(halves[dots[row, col], dots[row + 1, col]] 
+                        for col in range(dots.shape[1])) 
+                for row in range(0, dots.shape[0], 2)]
+    #braille dots 1-8 as (row, column) in the cell
+    dot_places = [(0, 0), (1, 0), (2, 0), (0, 1), (1, 1), (2, 1), (3, 0), 
+                  (3, 1)]
+    return ["".join(chr(0x2800 + sum(1 << number for number, (y, x) 
+                                     in enumerate(dot_places) 
+                                     if dots[row + y, col + x]))
+                    for col in range(0, dots.shape[1], 2))
+            for row in range(0, dots.shape[0], 4)]
+
+
+def glyph_distance(expected, actual, gscale):
+    '''returns an array with how far apart each letter of two renders are: 
+    the number of steps in gscale for ascii letters, and the number of dots 
+    that differ for half blocks and braille. Letters that can't be compared
+    count as 8. The rows are turned into arrays of codepoints so the 
+    comparison is done in numpy.'''
+    if len(expected) != len(actual) or \
+        {len(row) for row in expected + actual} != {len(expected[0])}:
+        raise ValueError("the renders don't have the same size")
+    
+    def codepoints(rows):
+        return np.frombuffer("".join(rows).encode("utf-32-le"), 
+                             dtype=np.uint32).reshape(len(rows), -1)
+    expected, actual = codepoints(expected), codepoints(actual)
+    
+    #ascii letters get their gscale index, other letters their dots
+    lookup_size = 0x2900
+    gscale_index = np.full(lookup_size, -1)
+    gscale_index[[ord(letter) for letter in gscale]] = np.arange(len(gscale))
+    dot_bits = np.full(lookup_size, -1)
+    dot_bits[0x2800:0x2900] = np.arange(256)
+    dot_bits[[0x20, 0x2584, 0x2580, 0x2588]] = [0, 1, 2, 3]
+    
+    expected = np.minimum(expected, lookup_size - 1)
+    actual = np.minimum(actual, lookup_size - 1)
+    distance = np.where(expected == actual, 0, 8)
+    ascii_letters = (gscale_index[expected] >= 0) & (gscale_index[actual] >= 0)
+    distance = np.where(ascii_letters, np.abs(gscale_index[expected] - 
+                                              gscale_index[actual]), distance)
+    dot_letters = ~ascii_letters & (dot_bits[expected] >= 0) & \
+        (dot_bits[actual] >= 0)
+    differing = np.unpackbits((dot_bits[expected] ^ dot_bits[actual]).astype(
+        np.uint8)[..., None], axis=-1).sum(axis=-1, dtype=np.intp)
+    return np.where(dot_letters, differing, distance)
+
+
+class TestGoldenRender(unittest.TestCase):
+    '''Regression tests for the rendered art itself. Each golden case is 
+    rendered and compared with the saved golden render: exactly for the 
+    synthetic gradients, and with a tolerance for the jpgs since their 
+    decoding (and so the pixels) can change a little between Pillow 
+    versions. The optimized render is also checked against the reference 
+    implementation above, and timed against it.'''
+    
+    #for the jpgs: the largest distance (see glyph_distance) a letter may 
+    #have, and the share of the letters that may differ at all
+    max_distance = 2
+    max_changed = 0.02
+    
+    #the optimized render must be at least this many times faster than the 
+    #reference, and take at most max_render_seconds for a 600 wide image
+    min_speedup = 5
+    max_render_seconds = 0.5
+    
+    def test_golden_renders(self):
+        '''testing that the render of every golden case is the same as (or 
+        for the jpgs, close to) the saved golden render'''
+        for case, (image, *settings) in GOLDEN_CASES.items():
+            with self.subTest(case = case):
+                ascii_object, rows = golden_render(case)
+                with open(os.path.join(GOLDEN_FOLDER, case + ".txt"), 
+                          encoding = "utf-8") as file:
+                    golden = file.read().splitlines()
+                if not image.endswith(".jpg"):
+                    self.assertEqual(rows, golden, 
+                                     "the render is not the same as the golden")
+                    continue
+                distance = glyph_distance(golden, rows, ascii_object.gscale)
+                self.assertLessEqual(distance.max(), self.max_distance, 
+                                     "a letter is too far from the golden")
+                self.assertLessEqual(np.mean(distance > 0), self.max_changed,
+                                     "too many letters differ from the golden")
+    
+    def test_reference_render(self):
+        '''testing that the optimized render gives exactly the same art as 
+        the reference implementation for every golden case'''
+        for case in GOLDEN_CASES:
+            with self.subTest(case = case):
+                ascii_object, rows = golden_render(case)
+                self.assertEqual(rows, reference_render(ascii_object),
+                                 "the render differs from the reference")
+    
+    def test_glyph_distance(self):
+        '''testing the distances between letters used by the tolerance'''
+        gscale = ASCII_art("grayscale.jpg").gscale
+        distance = glyph_distance(["$@ \u2800\u2584", "..\u28ff\u2801\u2588"],
+                                  ["$% \u2803\u2580", ".,\u2800\u2801 "], 
+                                  gscale)
+        self.assertEqual(distance.tolist(), [[0, 2, 0, 2, 2], [0, 5, 8, 0, 2]],
+                         "the distances are wrong")
+        with self.assertRaises(ValueError):
+            glyph_distance(["ab"], ["abc"], gscale)
+    
+    def test_render_speed(self):
+        '''testing that the optimized render is faster than the reference
+        and stays within max_render_seconds'''
+        ascii_object = ASCII_art("slalom.jpg")
+        ascii_object.resize(new_width = 600)
+        
+        start = time.perf_counter()
+        ascii_object.render(out = "test_speed.txt")
+        render_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        reference_render(ascii_object)
+        reference_seconds = time.perf_counter() - start
+        os.remove("test_speed.txt")
+        
+        self.assertLessEqual(render_seconds, self.max_render_seconds,
+                             "the render took longer than its budget")
+        self.assertLessEqual(render_seconds * self.min_speedup, 
+                             reference_seconds, 
+                             "the render is not faster than the reference")
+    
+    @classmethod
+    def tearDownClass(cls):
+        for name in ["gradient_h", "gradient_v", "gradient_d"]:
+            if os.path.exists(f"test_golden_{name}.png"):
+                os.remove(f"test_golden_{name}.png")
+
+
+def update_golden():
+    '''writes the golden render of every case again, after checking it 
+    against the reference implementation'''
+    os.makedirs(GOLDEN_FOLDER, exist_ok = True)
+    for case in GOLDEN_CASES:
+        ascii_object, rows = golden_render(case)
+        if rows != reference_render(ascii_object):
+            raise AssertionError(f"{case} differs from the reference render")
+        with open(os.path.join(GOLDEN_FOLDER, case + ".txt"), "w", 
+                  encoding = "utf-8", newline = "\n") as file:
+            file.write("\n".join(rows) + "\n")
+    TestGoldenRender.tearDownClass()
+
+
+if __name__ == '__main__':
+    if "--update-golden" in sys.argv:
+        update_golden()
+    else:
+        unittest.main()       
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for ASCII Art Studio. Run with: python benchmark.py
+
+Each benchmark prints a small table with the best time out of a few runs.
+Like the tests, this requires grayscale.jpg and slalom.jpg in the working 
+directory.
+"""
+
+import os
+import re
+import sys
+import time
+import tempfile
+import subprocess
+import numpy as np
+from PIL import Image
+from ASCII_Art_Studio import ASCII_art
+
+
+def best_time(function, repeat=5):
+    '''returns the shortest time in seconds out of repeat calls to function'''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench_encoders(width=1000, image="slalom.jpg"):
+    '''compares the time and file size of every output format in 
+    ASCII_art.output_encoders against writing plain text'''
+    
+    ascii_object = ASCII_art(image)
+    ascii_object.resize(new_width=width)
+    cells = ascii_object._target_width * ascii_object._target_height
+    extensions = [".txt"] + list(ASCII_art.output_encoders)
+    
+    print(f"\n=== Output encoders, {width}x{ascii_object._target_height} "
+          "cells ===")
+    print(f"{'format':>8} {'ms':>9} {'Mcells/s':>9} {'bytes':>10} "
+          f"{'vs text':>8}")
+    with tempfile.TemporaryDirectory() as folder:
+        text_time = None
+        for extension in extensions:
+            out = os.path.join(folder, "bench" + extension)
+            try:
+                seconds = best_time(lambda: ascii_object.render(out=out))
+            except ImportError as err_message:
+                print(f"{extension:>8} skipped: {err_message}")
+                continue
+            text_time = text_time or seconds
+            print(f"{extension:>8} {seconds * 1000:9.2f} "
+                  f"{cells / seconds / 1e6:9.1f} {os.path.getsize(out):10d} "
+                  f"{seconds / text_time:7.2f}x")
+
+
+def bench_modes(width=400, image="slalom.jpg"):
+    '''compares how fast every mode in ASCII_art.render_modes renders, with
+    and without dithering. Every mode gets the same number of letters, so 
+    braille reads 8 times as many pixels as ascii'''
+    
+    ascii_object = ASCII_art(image)
+    print(f"\n=== Render modes, {width} letters wide ===")
+    print(f"{'mode':>10} {'dither':>7} {'ms':>9} {'Mcells/s':>9} "
+          f"{'Mpixels/s':>10}")
+    with tempfile.TemporaryDirectory() as folder:
+        out = os.path.join(folder, "bench.txt")
+        for mode, (cell_width, cell_height) in ASCII_art.render_modes.items():
+            for dither in [False, True]:
+                ascii_object.set_mode(mode, dither)
+                ascii_object.resize(new_width=width)
+                cells = ascii_object._target_width * ascii_object._target_height
+                seconds = best_time(lambda: ascii_object.render(out=out))
+                pixels = cells * cell_width * cell_height
+                print(f"{mode:>10} {str(dither):>7} {seconds * 1000:9.2f} "
+                      f"{cells / seconds / 1e6:9.1f} "
+                      f"{pixels / seconds / 1e6:10.1f}")
+
+
+def bench_resize(size=5000, widths=(50, 1000)):
+    '''compares resizing a size x size image with the default 
+    resample="area" of ASCII_art.resize (with and without the cell variance)
+    against Pillow's own Image.resize with its default (bicubic) filter and 
+    with BOX'''
+    
+    pixels = np.random.default_rng(0).integers(0, 256, (size, size), 
+                                               dtype=np.uint8)
+    image = Image.fromarray(pixels)
+    ascii_object = ASCII_art.__new__(ASCII_art) #_resized needs no file
+    resizers = {
+        "area": lambda sizes: ascii_object._resized(image, sizes, "area"),
+        "area+var": lambda sizes: ascii_object._resized(image, sizes, "area",
+                                                        variance=True),
+        "bicubic": lambda sizes: image.resize(sizes),
+        "box": lambda sizes: image.resize(sizes, Image.Resampling.BOX),
+    }
+    
+    print(f"\n=== Resize, {size}x{size} pixels ===")
+    print(f"{'resample':>9} {'width':>6} {'ms':>9} {'vs bicubic':>11}")
+    for width in widths:
+        sizes = (width, width // 2)
+        times = {name: best_time(lambda: resize(sizes), repeat=3) 
+                 for name, resize in resizers.items()}
+        for name, seconds in times.items():
+            print(f"{name:>9} {width:>6} {seconds * 1000:9.1f} "
+                  f"{seconds / times['bicubic']:10.2f}x")
+
+
+# the longest time in seconds each kind of start of the program may take
+STARTUP_BUDGETS = {
+    "import": 0.05,
+    "--help": 0.15,
+    "render": 0.6,
+}
+
+
+def bench_startup(image="grayscale.jpg"):
+    '''measures how long it takes to import ASCII_Art_Studio (with python -X
+    importtime), to print the command line help and to render one image 
+    from the command line, and compares them with STARTUP_BUDGETS'''
+    
+    python = [sys.executable, "-X", "importtime"]
+    result = subprocess.run(python + ["-c", "import ASCII_Art_Studio"],
+                            capture_output=True, text=True, check=True)
+    #the last line of importtime is the module itself, with the cumulative
+    #time in microseconds in the second column
+    cumulative = re.findall(r"\|\s*(\d+) \|\s*ASCII_Art_Studio$", 
+                            result.stderr, re.MULTILINE)
+    times = {"import": int(cumulative[-1]) / 1e6}
+    
+    commands = {
+        "--help": [sys.executable, "ASCII_Art_Studio.py", "--help"],
+        "render": [sys.executable, "ASCII_Art_Studio.py", image],
+    }
+    for name, command in commands.items():
+        times[name] = best_time(lambda: subprocess.run(
+            command, capture_output=True, check=True), repeat=3)
+    
+    print("\n=== Startup ===")
+    print(f"{'run':>8} {'ms':>9} {'budget':>9}")
+    for name, seconds in times.items():
+        budget = STARTUP_BUDGETS[name]
+        status = "ok" if seconds <= budget else "OVER BUDGET"
+        print(f"{name:>8} {seconds * 1000:9.1f} {budget * 1000:9.1f} {status}")
+    return all(times[name] <= STARTUP_BUDGETS[name] for name in times)
+
+
+def main():
+    bench_encoders()
+    bench_modes()
+    bench_resize()
+    bench_startup()
+
+
+if __name__ == "__main__":
+    main()